@@ -0,0 +1,87 @@
+"""
+Fixtures and defaults of the microbenchmark suite. It is not part of the default test run; start it with
+
+    python -m pytest benchmarks --benchmark-only
+
+Save a baseline on the machine that runs the comparisons, for example before a change:
+
+    python -m pytest benchmarks --benchmark-only --benchmark-save=baseline
+
+Later runs are compared with the latest saved run in benchmarks/baselines and fail when the mean time of
+a benchmark grows by more than BENCHMARK_TOLERANCE percent (25 by default, below 100). BENCHMARK_SIZES selects the
+seeded datasets, for example BENCHMARK_SIZES=1000 for a quick run.
+"""
+import asyncio
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from src.database.models import Base, Contact, User
+from src.repository.contacts import contact_values
+
+BASELINES = Path(__file__).parent / 'baselines'
+DEFAULT_STORAGE = 'file://./.benchmarks'
+TOLERANCE = os.environ.get('BENCHMARK_TOLERANCE', '25')
+SIZES = tuple(int(size) for size in os.environ.get('BENCHMARK_SIZES', '1000,100000').split(','))
+NAMES = ('Wade', 'Peter', 'Bruce', 'Diana', 'Natasha', 'Logan', 'Steve', 'Carol')
+SURNAMES = ('Wilson', 'Parker', 'Wayne', 'Prince', 'Romanoff', 'Howlett', 'Rogers', 'Danvers')
+
+
+def pytest_configure(config):
+    if config.getoption('benchmark_storage') == DEFAULT_STORAGE:
+        config.option.benchmark_storage = f'file://{BASELINES}'
+    if not config.getoption('benchmark_compare') and any(BASELINES.glob('*/*.json')):
+        config.option.benchmark_compare = True
+    if config.getoption('benchmark_compare') and config.getoption('benchmark_compare_fail') is None:
+        config.option.benchmark_compare_fail = [parse_compare_fail(f'mean:{TOLERANCE}%')]
+
+
+def seed(url: str, size: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(Contact)).scalar() == size:
+            return
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        user_id = connection.execute(insert(User).values(username='bench', email='bench@example.com',
+                                                         password='hash', confirmed=True)
+                                     .returning(User.id)).scalar_one()
+        generator = random.Random(size)
+        start = datetime(1960, 1, 1)
+        rows = [contact_values(dict(firstname=generator.choice(NAMES), lastname=generator.choice(SURNAMES),
+                                    email=f'contact{index}@example.com', phone=f'+380{index:09}',
+                                    birthday=start + timedelta(days=generator.randrange(365 * 60)),
+                                    created_at=start, updated_at=start, user_id=user_id))
+                for index in range(size)]
+        for offset in range(0, size, 10000):
+            connection.execute(insert(Contact), rows[offset:offset + 10000])
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='session', params=SIZES, ids=lambda size: f'{size}_contacts')
+def dataset(request, loop):
+    """
+    A SQLite database with one user owning size contacts. The file is kept in the temp directory and reused
+    by later runs.
+    """
+    path = Path(tempfile.gettempdir()) / f'contacts-benchmark-{request.param}.db'
+    seed(f'sqlite:///{path}', request.param)
+    engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    yield sessions, User(id=1, email='bench@example.com')
+    loop.run_until_complete(engine.dispose())
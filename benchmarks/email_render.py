@@ -0,0 +1,37 @@
+"""
+Per-message cost of rendering confirmation emails: a template environment built and the template parsed
+for every message, as fastapi-mail did, against the compiled template reused by render_emails.
+
+    python -m benchmarks.email_render
+"""
+from timeit import timeit
+
+from src.services.email import get_mail_config, render_emails, get_template, CONFIRMATION_SUBJECT, CONFIRMATION_TEMPLATE
+
+NUMBER = 2000
+BODY = {"host": "http://localhost:8000/", "username": "deadpool", "token": "x" * 160}
+
+
+def main():
+    recipients = [(f"user{i}@example.com", BODY) for i in range(NUMBER)]
+
+    def per_message():
+        for email, template_body in recipients:
+            get_mail_config().template_engine().get_template(CONFIRMATION_TEMPLATE).render(**template_body)
+
+    def cached_render():
+        template = get_template(CONFIRMATION_TEMPLATE)
+        for email, template_body in recipients:
+            template.render(**template_body)
+
+    def bulk_messages():
+        for message in render_emails(recipients, CONFIRMATION_SUBJECT):
+            message.as_bytes()
+
+    for name, func in (("parse per message", per_message), ("cached template", cached_render),
+                       ("render_emails + MIME", bulk_messages)):
+        print(f"{name:22} {timeit(func, number=1) / NUMBER * 1e6:8.2f} us/message")
+
+
+if __name__ == '__main__':
+    main()
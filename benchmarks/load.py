@@ -0,0 +1,211 @@
+"""
+HTTP load test of the Contacts API. Seeds users and contacts into the database from settings, starts main:app
+under uvicorn and drives it with concurrent clients that log in and then list, search, read birthdays and
+create contacts. Prints RPS, p50/p95/p99 latency and the error rate of every scenario as JSON.
+
+    docker compose up -d
+    alembic upgrade head
+    python -m benchmarks.load --users 20 --contacts 1000 --concurrency 32 --duration 30 --output load.json
+
+The rate limiter is raised for the server started by the harness, so the numbers show the capacity of the
+application, not the configured limits. Use --url to test a server that is already running.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from src.conf.config import settings
+from src.database.db import DBSession, engine
+from src.database.models import Contact, User
+from src.repository.contacts import contact_values
+from src.services.auth import auth_service
+
+EMAIL = 'load{}@example.com'
+PASSWORD = 'load-test-password'
+SCENARIOS = {"list": 40, "search": 20, "birthdays": 15, "create": 10, "login": 5}
+SEARCH_TERMS = ('Wade', 'Wil', 'example', '+38050', 'ilso')
+
+
+async def seed(users: int, contacts: int):
+    """
+    The seed function replaces the load test users and their contacts. All users share one password hash.
+
+    :param users: int: The number of users
+    :param contacts: int: The number of contacts of every user
+    :return: None
+    """
+    password = await auth_service.get_password_hash(PASSWORD)
+    today = datetime.now()
+    async with DBSession() as db:
+        load_users = select(User.id).filter(User.email.like(EMAIL.format('%')))
+        await db.execute(delete(Contact).filter(Contact.user_id.in_(load_users)))
+        await db.execute(delete(User).filter(User.email.like(EMAIL.format('%'))))
+        for number in range(users):
+            user_id = (await db.execute(insert(User).values(
+                username=f'load{number}', email=EMAIL.format(number), password=password, confirmed=True)
+                .returning(User.id))).scalar_one()
+            rows = [contact_values(dict(firstname=random.choice(('Wade', 'Peter', 'Bruce', 'Diana')),
+                                        lastname=random.choice(('Wilson', 'Parker', 'Wayne', 'Prince')),
+                                        email=f'load{number}.{index}@example.com',
+                                        phone=f'+38050{number:03}{index:05}',
+                                        birthday=today - timedelta(days=random.randrange(365 * 60)),
+                                        user_id=user_id))
+                    for index in range(contacts)]
+            for start in range(0, len(rows), settings.bulk_import_batch_size):
+                await db.execute(insert(Contact), rows[start:start + settings.bulk_import_batch_size])
+        await db.commit()
+    await engine.dispose()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    The percentile function returns the nearest-rank percentile of sorted values.
+
+    :param values: list[float]: Sorted values
+    :param q: float: The percentile between 0 and 100
+    :return: The value or 0 if there are no values
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+async def login(client: httpx.AsyncClient, number: int) -> str:
+    response = await client.post('/api/auth/login', data={"username": EMAIL.format(number), "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def request(client: httpx.AsyncClient, scenario: str, number: int, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    if scenario == 'list':
+        return client.get('/api/contacts/', params={"limit": 25, "skip": random.randrange(0, 200, 25)},
+                          headers=headers)
+    if scenario == 'search':
+        return client.get(f'/api/contacts/search/{random.choice(SEARCH_TERMS)}', headers=headers)
+    if scenario == 'birthdays':
+        return client.get('/api/contacts/get/7-birthdays', headers=headers)
+    if scenario == 'create':
+        suffix = random.randrange(10 ** 9)
+        return client.post('/api/contacts/', headers=headers, json={
+            "firstname": "Load", "lastname": "Test", "email": f'created{suffix}@example.com',
+            "phone": f'+39{suffix:09}', "birthday": "1990-01-01T00:00:00"})
+    return client.post('/api/auth/login', data={"username": EMAIL.format(number), "password": PASSWORD})
+
+
+async def run_load(url: str, users: int, concurrency: int, duration: float) -> dict:
+    """
+    The run_load function runs concurrency clients for duration seconds. Client i acts as user i % users
+    and picks scenarios at random with the weights of SCENARIOS.
+
+    :param url: str: The base url of the server
+    :param users: int: The number of seeded users
+    :param concurrency: int: The number of concurrent clients
+    :param duration: float: How long to send requests, in seconds
+    :return: The report
+    """
+    latencies = {scenario: [] for scenario in SCENARIOS}
+    errors = {scenario: 0 for scenario in SCENARIOS}
+    names, weights = list(SCENARIOS), list(SCENARIOS.values())
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        tokens = [await login(client, number) for number in range(min(users, concurrency))]
+        deadline = perf_counter() + duration
+
+        async def worker(index: int):
+            number = index % len(tokens)
+            while perf_counter() < deadline:
+                scenario = random.choices(names, weights)[0]
+                start = perf_counter()
+                try:
+                    response = await request(client, scenario, number, tokens[number])
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies[scenario].append(perf_counter() - start)
+                errors[scenario] += failed
+
+        started = perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = perf_counter() - started
+
+    def summary(values: list[float], failed: int) -> dict:
+        values = sorted(values)
+        return {"requests": len(values), "rps": round(len(values) / elapsed, 1),
+                "error_rate": round(failed / len(values), 4) if values else 0.0,
+                **{f"p{q}_ms": round(percentile(values, q) * 1000, 2) for q in (50, 95, 99)}}
+
+    return {"total": summary([value for values in latencies.values() for value in values], sum(errors.values())),
+            "scenarios": {scenario: summary(latencies[scenario], errors[scenario]) for scenario in SCENARIOS}}
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, RATE_LIMIT_DEFAULT='1000000/1')
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--workers',
+                             str(workers), '--no-access-log'], env=env)
+
+
+async def wait_ready(url: str, server: subprocess.Popen | None, timeout: float = 30):
+    async with httpx.AsyncClient(base_url=url) as client:
+        deadline = perf_counter() + timeout
+        while True:
+            try:
+                (await client.get('/')).raise_for_status()
+                return
+            except httpx.HTTPError:
+                if perf_counter() > deadline or (server is not None and server.poll() is not None):
+                    raise
+                await asyncio.sleep(0.2)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--contacts', type=int, default=1000, help='contacts of every user')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help='test a running server instead of starting one')
+    parser.add_argument('--no-seed', action='store_true', help='reuse the users of the previous run')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        asyncio.run(seed(args.users, args.contacts))
+    server = None if args.url else start_server(args.port, args.workers)
+    url = args.url or f'http://127.0.0.1:{args.port}'
+    try:
+        asyncio.run(wait_ready(url, server))
+        results = asyncio.run(run_load(url, args.users, args.concurrency, args.duration))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report = {"commit": git_commit(), "date": datetime.now().isoformat(timespec='seconds'),
+              "config": {key: value for key, value in vars(args).items() if key != 'output'}, **results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Per-page cost of serializing a contacts list: the response_model path of FastAPI (pydantic validation of every
+ORM row, jsonable_encoder and the stdlib encoder) against dump_rows encoded by ORJSONResponse.
+
+    python -m benchmarks.serialization
+"""
+from datetime import datetime
+from timeit import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services.serialization import dump_rows
+
+NUMBER = 50
+PAGE_SIZES = (25, 100, 500)
+
+
+def main():
+    for size in PAGE_SIZES:
+        contacts = [Contact(id=i, firstname='Wade', lastname='Wilson', email=f'user{i}@example.com',
+                            phone='+380501234567', birthday=datetime(1991, 2, 1), created_at=datetime(2023, 5, 1),
+                            updated_at=datetime(2023, 5, 1)) for i in range(size)]
+
+        def response_model():
+            JSONResponse(jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts]))
+
+        def fast_path():
+            ORJSONResponse(dump_rows(ContactResponse, contacts))
+
+        for name, func in (("response_model", response_model), ("dump_rows + orjson", fast_path)):
+            print(f"{size:4} rows  {name:20} {timeit(func, number=NUMBER) / NUMBER * 1e3:8.3f} ms/page")
+
+
+if __name__ == '__main__':
+    main()
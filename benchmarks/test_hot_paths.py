@@ -0,0 +1,92 @@
+"""
+Microbenchmarks of the hot paths of a request: repository queries over the seeded datasets, token handling
+in Auth and the serialization of contact pages. See conftest.py for baselines and tolerances.
+"""
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from src.database.models import Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactResponse
+from src.services.auth import auth_service
+from src.services.cache import token_cache, user_cache
+from src.services.serialization import dump_rows
+
+PAGE = 25
+
+
+def run_query(benchmark, loop, dataset, query, *args, **kwargs):
+    sessions, user = dataset
+
+    async def call():
+        async with sessions() as db:
+            return await query(*args, user, db, **kwargs)
+
+    return benchmark(lambda: loop.run_until_complete(call()))
+
+
+def test_get_contacts(benchmark, loop, dataset):
+    contacts = run_query(benchmark, loop, dataset, repository_contacts.get_contacts, 0, PAGE)
+    assert len(contacts) == PAGE
+
+
+def test_get_contacts_after_cursor(benchmark, loop, dataset):
+    contacts = run_query(benchmark, loop, dataset, lambda *args: repository_contacts.get_contacts(
+        0, PAGE, *args, cursor=500))
+    assert contacts[0].id == 501
+
+
+def test_get_contacts_by_info(benchmark, loop, dataset):
+    contacts = run_query(benchmark, loop, dataset, repository_contacts.get_contacts_by_info, 'wil', limit=PAGE)
+    assert contacts
+
+
+def test_get_contacts_7days_birthdays(benchmark, loop, dataset):
+    run_query(benchmark, loop, dataset, repository_contacts.get_contacts_7days_birthdays, days=7)
+
+
+def test_create_access_token(benchmark, loop):
+    token = benchmark(lambda: loop.run_until_complete(auth_service.create_access_token({"sub": "bench@example.com"})))
+    assert token
+
+
+def cache_user(loop):
+    generation = loop.run_until_complete(user_cache.generation('bench@example.com'))
+    user = User(id=1, email='bench@example.com', created_at=datetime(2023, 5, 1))
+    loop.run_until_complete(user_cache.set(user, generation))
+
+
+def test_get_current_user_decode(benchmark, loop):
+    token = loop.run_until_complete(auth_service.create_access_token({"sub": "bench@example.com"}))
+    cache_user(loop)
+
+    def decode():
+        token_cache._payloads.clear()
+        return loop.run_until_complete(auth_service.get_current_user(token, None))
+
+    assert benchmark(decode).email == 'bench@example.com'
+
+
+def test_get_current_user_cached_token(benchmark, loop):
+    token = loop.run_until_complete(auth_service.create_access_token({"sub": "bench@example.com"}))
+    cache_user(loop)
+    user = benchmark(lambda: loop.run_until_complete(auth_service.get_current_user(token, None)))
+    assert user.email == 'bench@example.com'
+
+
+def contacts_page(size: int) -> list[Contact]:
+    return [Contact(id=i, firstname='Wade', lastname='Wilson', email=f'user{i}@example.com', phone='+380501234567',
+                    birthday=datetime(1991, 2, 1), created_at=datetime(2023, 5, 1), updated_at=datetime(2023, 5, 1))
+            for i in range(size)]
+
+
+def test_serialize_response_model(benchmark):
+    contacts = contacts_page(500)
+    benchmark(lambda: JSONResponse(jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts])))
+
+
+def test_serialize_dump_rows(benchmark):
+    contacts = contacts_page(500)
+    benchmark(lambda: ORJSONResponse(dump_rows(ContactResponse, contacts)))
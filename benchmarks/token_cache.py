@@ -0,0 +1,39 @@
+"""
+Per-request cost of resolving the bearer token in Auth.get_current_user with and without token_cache.
+
+    python -m benchmarks.token_cache
+"""
+import asyncio
+from timeit import timeit
+
+from jose import jwt
+
+from src.services.auth import auth_service
+from src.services.cache import TokenCache
+
+NUMBER = 20000
+
+
+def main():
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "bench@example.com"}))
+    cache = TokenCache(maxsize=1024)
+
+    def decode():
+        return jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+
+    def cached():
+        payload = cache.get(token)
+        if payload is None:
+            payload = decode()
+            cache.set(token, payload)
+        return payload
+
+    decode_us = timeit(decode, number=NUMBER) / NUMBER * 1e6
+    cached_us = timeit(cached, number=NUMBER) / NUMBER * 1e6
+    print(f"jwt.decode:  {decode_us:8.2f} us/request")
+    print(f"token_cache: {cached_us:8.2f} us/request")
+    print(f"saving:      {decode_us - cached_us:8.2f} us/request ({decode_us / cached_us:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,16 @@
-import redis.asyncio as redis
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-
-from fastapi_limiter import FastAPILimiter
+from fastapi.staticfiles import StaticFiles
 
 from src.conf.config import settings
-from src.routes import contacts, auth, users
-
-app = FastAPI()
-
+from src.database.cache import redis_client
+from src.database.db import engine
+from src.routes import contacts, auth, users, internal
+from src.services.cache import user_cache, contacts_version, contacts_pages
+from src.services.rate_limit import rate_limiter
+from src.services.refresh_tokens import refresh_tokens
+from src.services.metrics import MetricsMiddleware, instrument_engine
 
-@app.on_event("startup")
 async def startup():
     """
     The startup function is called when the application starts up.
@@ -19,29 +19,29 @@ async def startup():
     :return: A list of coroutines
     :doc-author: Trelent
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    rate_limiter.init(redis_client)
+    await rate_limiter.start()
+    user_cache.init(redis_client)
+    contacts_version.init(redis_client)
+    contacts_pages.init(redis_client)
+    refresh_tokens.init(redis_client)
+
+
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It sends the rate limit hits counted since the last sync.
+
+    :return: None
+    """
+    await rate_limiter.stop()
 
 
 origins = [
     "http://localhost:3000", 'http://127.0.0.1:5500', 'http://localhost:5500',
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.include_router(auth.router, prefix='/api')
-app.include_router(contacts.router, prefix='/api')
-app.include_router(users.router, prefix='/api')
-
 
-@app.get("/")
 def read_root():
     """
     The read_root function is a view function that returns a dictionary
@@ -53,3 +53,42 @@ def read_root():
     :doc-author: Trelent
     """
     return {"message": "Contacts API"}
+
+
+def create_app() -> FastAPI:
+    """
+    The create_app function builds the application: middleware, routers, static files and lifecycle handlers.
+    Heavy subsystems (password hashing, JWT, mail, templates, avatar processing and storage) are not imported here;
+    they are loaded by the first request that needs them, which keeps imports and cold starts fast.
+
+    :return: The application
+    """
+    app = FastAPI()
+    app.add_event_handler("startup", startup)
+    app.add_event_handler("shutdown", shutdown)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine.sync_engine)
+
+    app.include_router(auth.router, prefix='/api')
+    app.include_router(contacts.router, prefix='/api')
+    app.include_router(users.router, prefix='/api')
+    if settings.internal_routes:
+        app.include_router(internal.router)
+
+    if settings.avatar_storage == 'local':
+        app.mount(settings.avatar_base_url, StaticFiles(directory=settings.avatar_local_dir, check_dir=False),
+                  name="avatars")
+
+    app.get("/")(read_root)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,24 @@
+"""Contacts-keyset
+
+Revision ID: 3c1d7e5a9b42
+Revises: f6f9138cad01
+Create Date: 2026-10-17 10:12:31.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d7e5a9b42'
+down_revision = 'f6f9138cad01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
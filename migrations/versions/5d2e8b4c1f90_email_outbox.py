@@ -0,0 +1,37 @@
+"""Email-outbox
+
+Revision ID: 5d2e8b4c1f90
+Revises: c7b90e13a5f8
+Create Date: 2026-10-17 15:26:47.093318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8b4c1f90'
+down_revision = 'c7b90e13a5f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=250), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=True),
+    sa.Column('host', sa.String(length=255), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['sent_at', 'available_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_pending', table_name='email_outbox')
+    op.drop_table('email_outbox')
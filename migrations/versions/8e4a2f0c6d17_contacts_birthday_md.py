@@ -0,0 +1,30 @@
+"""Contacts-birthday-md
+
+Revision ID: 8e4a2f0c6d17
+Revises: 3c1d7e5a9b42
+Create Date: 2026-10-17 11:40:08.517362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a2f0c6d17'
+down_revision = '3c1d7e5a9b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.Integer(), nullable=True))
+    op.execute("UPDATE contacts "
+               "SET birthday_md = CAST(EXTRACT(MONTH FROM birthday) AS INTEGER) * 100 "
+               "+ CAST(EXTRACT(DAY FROM birthday) AS INTEGER) "
+               "WHERE birthday IS NOT NULL")
+    op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
@@ -0,0 +1,34 @@
+"""Contacts-trigram-search
+
+Revision ID: c7b90e13a5f8
+Revises: 8e4a2f0c6d17
+Create Date: 2026-10-17 13:02:55.871940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7b90e13a5f8'
+down_revision = '8e4a2f0c6d17'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = ('firstname', 'lastname', 'email', 'phone')
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        op.create_index(f'ix_contacts_{field}_trgm', 'contacts', [field], unique=False,
+                        postgresql_using='gin', postgresql_ops={field: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        op.drop_index(f'ix_contacts_{field}_trgm', table_name='contacts')
@@ -0,0 +1,9 @@
+import redis.asyncio as redis
+
+from src.conf.config import settings
+
+# Redis only holds caches, limits and sessions, so a slow server fails fast with a RedisError instead of
+# stalling every request that touches it
+redis_client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
+                           decode_responses=True, socket_timeout=settings.redis_socket_timeout,
+                           socket_connect_timeout=settings.redis_connect_timeout)
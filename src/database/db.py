@@ -1,31 +1,82 @@
+from time import perf_counter
+
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import settings
 
 URI = settings.sqlalchemy_database_url
 
-engine = create_engine(URI, echo=True)
-DBSession = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that measures how long every checkout waits for a connection,
+    including the time to open an overflow connection, and counts checkouts that timed out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            self.waits += 1
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+
+
+engine = create_async_engine(URI, echo=settings.db_echo, poolclass=InstrumentedQueuePool,
+                             pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow,
+                             pool_timeout=settings.db_pool_timeout, pool_recycle=settings.db_pool_recycle,
+                             pool_pre_ping=settings.db_pool_pre_ping)
+DBSession = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+
+def get_pool_stats(db_engine: AsyncEngine = engine) -> dict:
+    """
+    The get_pool_stats function returns the current state of the connection pool of the engine
+    together with the checkout wait counters collected by InstrumentedQueuePool.
+
+    :param db_engine: AsyncEngine: The engine to inspect
+    :return: A dictionary with the pool counters
+    """
+    pool = db_engine.pool
+    stats = {"size": pool.size(), "checked_in": pool.checkedin(), "checked_out": pool.checkedout(),
+             "overflow": pool.overflow()}
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({"waits": pool.waits, "timeouts": pool.timeouts,
+                      "avg_wait_ms": pool.wait_time / pool.waits * 1000 if pool.waits else 0.0,
+                      "max_wait_ms": pool.max_wait_time * 1000})
+    return stats
 
 
 # Dependency
-def get_db():
+async def get_db():
     """
-    The get_db function is a context manager that will automatically close the database session at the end of a request.
-    It also handles any exceptions that occur during the request, rolling back any changes to the database if an
-    exception occurs.
+    The get_db function is an async context manager that will automatically close the database session at the end
+    of a request. It also handles any exceptions that occur during the request, rolling back any changes to the
+    database if an exception occurs.
 
-    :return: A database connection
+    :return: An asynchronous database session
     :doc-author: Trelent
     """
     db = DBSession()
     try:
         yield db
     except SQLAlchemyError as err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
     finally:
-        db.close()
+        await db.close()
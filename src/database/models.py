@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, func, ForeignKey, UniqueConstraint, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, func, ForeignKey, UniqueConstraint, Boolean, Index
+from sqlalchemy.orm import relationship, validates
+from datetime import datetime
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.ext.declarative import declarative_base
 #from sqlalchemy_utils import PhoneNumberType
@@ -9,7 +10,12 @@ Base = declarative_base()
 
 class Contact(Base):
     __tablename__ = "contacts"
-    __table_args__ = (UniqueConstraint('phone', 'user_id', name='unique_phone_user'),)
+    __table_args__ = (UniqueConstraint('phone', 'user_id', name='unique_phone_user'),
+                      Index('ix_contacts_user_id_id', 'user_id', 'id'),
+                      Index('ix_contacts_user_id_birthday_md', 'user_id', 'birthday_md'),
+                      *(Index(f'ix_contacts_{field}_trgm', field, postgresql_using='gin',
+                              postgresql_ops={field: 'gin_trgm_ops'})
+                        for field in ('firstname', 'lastname', 'email', 'phone')),)
 
     id = Column(Integer, primary_key=True)
     firstname = Column(String(50), index=True, nullable=False)
@@ -17,12 +23,18 @@ class Contact(Base):
     email = Column(String(100), unique=True, index=True)
     phone = Column(String(20), unique=True, index=True, nullable=False)
     birthday = Column(DateTime, index=True)
+    birthday_md = Column(Integer)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="contacts")
 
+    @validates('birthday')
+    def validate_birthday(self, key, birthday):
+        self.birthday_md = birthday.month * 100 + birthday.day if birthday else None
+        return birthday
+
 
 class User(Base):
     __tablename__ = "users"
@@ -34,3 +46,18 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index('ix_email_outbox_pending', 'sent_at', 'available_at', 'id'),)
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String(250), nullable=False)
+    username = Column(String(50))
+    host = Column(String(255), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    available_at = Column(DateTime, nullable=False, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
@@ -1,109 +1,253 @@
-from typing import List
-from datetime import datetime, timedelta
+import binascii
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import AsyncIterator, List, Tuple
+from datetime import date, timedelta
 
-from sqlalchemy import or_, and_
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, or_, and_, case, func, Row
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.models import Contact, User
-from src.schemas import ContactModel
+from src.schemas import ContactModel, ContactPatchModel
+from src.services.cache import contacts_version
 
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+def encode_cursor(contact_id: int) -> str:
     """
-    The get_contacts function returns a list of contacts for the user.
+    The encode_cursor function turns the id of the last contact on a page into an opaque cursor string.
+
+    :param contact_id: int: The id of the last contact that was returned
+    :return: A url-safe cursor string
+    """
+    return urlsafe_b64encode(str(contact_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    The decode_cursor function restores the contact id hidden in a cursor made by encode_cursor.
+
+    :param cursor: str: The cursor received from the client
+    :return: The id of the last contact of the previous page
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        return int(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError) as err:
+        raise ValueError(f'Invalid cursor: {cursor}') from err
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: AsyncSession, cursor: int | None = None) -> List[Contact]:
+    """
+    The get_contacts function returns a list of contacts for the user ordered by id.
+    When a cursor is given the page starts right after that contact id, using the (user_id, id) index
+    instead of scanning the skipped rows, and skip is ignored.
 
     :param skip: int: Skip a certain number of records
     :param limit: int: Limit the number of contacts returned
     :param user: User: Get the user id from the user object
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: int | None: The id of the last contact of the previous page
     :return: A list of contacts
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    if cursor is not None:
+        stmt = stmt.filter(Contact.id > cursor)
+    else:
+        stmt = stmt.offset(skip)
+    stmt = stmt.order_by(Contact.id).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+EXPORT_COLUMNS = (Contact.id, Contact.firstname, Contact.lastname, Contact.email, Contact.phone, Contact.birthday,
+                  Contact.created_at, Contact.updated_at)
 
 
-async def get_contact_by_id(contact_id: int, user: User, db: Session) -> Contact:
+async def stream_contacts(user: User, db: AsyncSession) -> AsyncIterator[Row]:
+    """
+    The stream_contacts function yields all contacts of the user as plain rows of EXPORT_COLUMNS ordered by id.
+    The rows are fetched through a server-side cursor settings.export_batch_size at a time,
+    so no ORM objects are built and the full result is never held in memory.
+
+    :param user: User: Get the user id from the user object
+    :param db: AsyncSession: Access the database
+    :return: An async iterator of rows
+    """
+    stmt = select(*EXPORT_COLUMNS).filter(Contact.user_id == user.id).order_by(Contact.id) \
+        .execution_options(yield_per=settings.export_batch_size)
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+
+async def get_contact_by_id(contact_id: int, user: User, db: AsyncSession) -> Contact:
     """
     The get_contact_by_id function returns a contact from the database by its id.
 
     :param contact_id: int: Pass the contact id to the function
     :param user: User: Get the user's id, which is used to filter the contacts
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The contact with the given id
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    stmt = select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    contact = await db.execute(stmt)
+    return contact.scalars().first()
 
 
-async def get_contacts_by_info(information: str, user: User, db: Session) -> List[Contact]:
+async def get_contacts_by_info(information: str, user: User, db: AsyncSession,
+                               skip: int = 0, limit: int = 25) -> List[Contact]:
     """
     The get_contacts_by_info function takes in a string of information, a user object, and the database session.
-    It then returns all contacts that match the given information.
+    It then returns the contacts whose firstname, lastname, email or phone contain the given information,
+    ignoring case. Exact matches come first, then prefix matches, then the rest.
+    On PostgreSQL the search is served by the pg_trgm GIN indexes and also finds names with typos,
+    ranked by trigram similarity; other databases fall back to a plain LIKE search.
 
-    :param information: str: Filter the contacts by firstname, lastname or email
+    :param information: str: Filter the contacts by firstname, lastname, email or phone
     :param user: User: Get the user id from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param skip: int: Skip a certain number of matches
+    :param limit: int: Limit the number of contacts returned
     :return: A list of contacts that match the information provided by the user
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).filter(or_(Contact.firstname == information,
-                                                                           Contact.lastname == information,
-                                                                           Contact.email == information, )).all()
+    fields = (Contact.firstname, Contact.lastname, Contact.email, Contact.phone)
+    escaped = information.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    exact = or_(*(func.lower(field) == information.lower() for field in fields))
+    prefix = or_(*(field.ilike(f'{escaped}%', escape='\\') for field in fields))
+    substring = or_(*(field.ilike(f'%{escaped}%', escape='\\') for field in fields))
+
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    if db.get_bind().dialect.name == 'postgresql':
+        fuzzy = or_(*(field.op('%')(information) for field in fields[:2]))
+        similarity = func.greatest(*(func.similarity(field, information) for field in fields[:2]))
+        stmt = stmt.filter(or_(substring, fuzzy)) \
+            .order_by(case((exact, 0), (prefix, 1), (substring, 2), else_=3), similarity.desc())
+    else:
+        stmt = stmt.filter(substring).order_by(case((exact, 0), (prefix, 1), else_=2))
+    stmt = stmt.order_by(Contact.id).offset(skip).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+def birthday_window(today: date, days: int) -> Tuple[int, int]:
+    """
+    The birthday_window function converts the period from tomorrow to today + days into a pair of
+    month * 100 + day keys that can be compared with Contact.birthday_md.
+    When the period crosses the new year the first key is greater than the second one.
+
+    :param today: date: The day the period is counted from
+    :param days: int: The length of the period in days
+    :return: The keys of the first and the last day of the period
+    """
+    start = today + timedelta(days=1)
+    end = today + timedelta(days=days)
+    return start.month * 100 + start.day, end.month * 100 + end.day
 
 
-async def get_contacts_7days_birthdays(user: User, db: Session) -> List[Contact] | None:
+async def get_contacts_7days_birthdays(user: User, db: AsyncSession, days: int = 7) -> List[Contact]:
     """
-    The get_contacts_7days_birthdays function returns a list of contacts whose birthdays are within the next 7 days.
+    The get_contacts_7days_birthdays function returns a list of contacts whose birthdays are within the next days.
+    The search runs in the database on the indexed birthday_md key, so February 29 birthdays and
+    periods that cross the new year need no special handling. Contacts are sorted by the next occurrence.
         Args:
             user (User): The User object for which to retrieve contacts.
-            db (Session): A database session object used to query the database.
+            db (AsyncSession): A database session object used to query the database.
+            days (int): The number of days to look ahead.
 
     :param user: User: Get the user id from the user object
-    :param db: Session: Pass in the database session
-    :return: A list of contacts whose birthday is within the next 7 days
+    :param db: AsyncSession: Pass in the database session
+    :param days: int: The number of days to look ahead
+    :return: A list of contacts whose birthday is within the next days
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
-    current_date = datetime.now()
-    end_date = current_date + timedelta(days=7)
-    birthdays_7days_list = []
-    if contacts:
-        for contact in contacts:
-            this_year_birthday = contact.birthday.replace(year=current_date.year)
-            if current_date < this_year_birthday <= end_date:
-                birthdays_7days_list.append(contact)
-        return birthdays_7days_list
+    start_md, end_md = birthday_window(date.today(), days)
+    if start_md <= end_md:
+        in_window = and_(Contact.birthday_md >= start_md, Contact.birthday_md <= end_md)
     else:
-        return None
+        in_window = or_(Contact.birthday_md >= start_md, Contact.birthday_md <= end_md)
+    stmt = select(Contact).filter(Contact.user_id == user.id).filter(in_window) \
+        .order_by(case((Contact.birthday_md >= start_md, 0), else_=1), Contact.birthday_md)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+def contact_values(values: dict) -> dict:
+    """
+    The contact_values function adds the birthday_md column to the values of a Core INSERT or UPDATE.
+    Core statements bypass the @validates hook that keeps it in sync on ORM objects.
+
+    :param values: dict: The column values taken from the request body
+    :return: The values with birthday_md set whenever birthday is
+    """
+    if 'birthday' in values:
+        birthday = values['birthday']
+        values['birthday_md'] = birthday.month * 100 + birthday.day if birthday else None
+    return values
 
 
-async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
+async def create_contact(body: ContactModel, user: User, db: AsyncSession) -> Contact:
     """
     The create_contact function creates a new contact in the database.
+    The row is inserted and read back with a single INSERT ... RETURNING.
 
     :param body: ContactModel: Get the data from the request body
     :param user: User: Get the user id from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = Contact(
-        firstname=body.firstname,
-        lastname=body.lastname,
-        email=body.email,
-        phone=body.phone,
-        birthday=body.birthday,
-        user_id=user.id
-    )
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    stmt = insert(Contact).values(**contact_values(body.dict()), user_id=user.id).returning(Contact)
+    contact = await db.execute(stmt)
+    contact = contact.scalars().one()
+    await db.commit()
+    await contacts_version.bump(user.id)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactModel, user: User, db: Session) -> Contact | None:
+async def create_contacts(bodies: List[ContactModel], user: User, db: AsyncSession) -> List[str]:
+    """
+    The create_contacts function inserts a batch of contacts with a single executemany INSERT and commits it.
+    Rows that clash with an existing contact on phone or email (the unique_phone_user constraint included)
+    are skipped by ON CONFLICT DO NOTHING instead of failing the whole batch.
+
+    :param bodies: List[ContactModel]: The validated contacts of the batch
+    :param user: User: Get the user id from the token
+    :param db: AsyncSession: Access the database
+    :return: The phones of the contacts that were actually inserted
+    """
+    if not bodies:
+        return []
+    rows = [dict(contact_values(body.dict()), user_id=user.id) for body in bodies]
+    insert = postgresql_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    stmt = insert(Contact).on_conflict_do_nothing().returning(Contact.phone)
+    result = await db.execute(stmt, rows)
+    phones = result.scalars().all()
+    await db.commit()
+    if phones:
+        await contacts_version.bump(user.id)
+    return phones
+
+
+async def _update_contact(contact_id: int, values: dict, user: User, db: AsyncSession) -> Contact | None:
+    stmt = update(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)) \
+        .values(**contact_values(values)).returning(Contact)
+    contact = await db.execute(stmt)
+    contact = contact.scalars().first()
+    if contact:
+        await db.commit()
+        await contacts_version.bump(user.id)
+    return contact
+
+
+async def update_contact(contact_id: int, body: ContactModel, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_contact function updates a contact in the database.
+    The row is updated and read back with a single UPDATE ... RETURNING scoped by user_id.
         Args:
             contact_id (int): The id of the contact to update.
             body (ContactModel): The updated ContactModel object with new values for firstname, lastname, email, phone and birthday.
@@ -112,37 +256,49 @@ async def update_contact(contact_id: int, body: ContactModel, user: User, db: Se
     :param contact_id: int: Specify the id of the contact to be deleted
     :param body: ContactModel: Pass the contact information to be updated
     :param user: User: Get the user id of the current user
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.firstname = body.firstname
-        contact.lastname = body.lastname
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        db.commit()
-    return contact
+    return await _update_contact(contact_id, body.dict(), user, db)
+
+
+async def patch_contact(contact_id: int, body: ContactPatchModel, user: User, db: AsyncSession) -> Contact | None:
+    """
+    The patch_contact function updates only the fields that were sent in the request body.
+    Fields sent as null are ignored. A body without fields returns the contact unchanged.
+
+    :param contact_id: int: The id of the contact to update
+    :param body: ContactPatchModel: The fields to change
+    :param user: User: Get the user id of the current user
+    :param db: AsyncSession: Access the database
+    :return: The updated contact or None if the user has no such contact
+    """
+    values = body.dict(exclude_unset=True, exclude_none=True)
+    if not values:
+        return await get_contact_by_id(contact_id, user, db)
+    return await _update_contact(contact_id, values, user, db)
 
 
-async def remove_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
     The remove_contact function removes a contact from the database.
+    The row is deleted and returned with a single DELETE ... RETURNING scoped by user_id.
         Args:
             contact_id (int): The id of the contact to be removed.
             user (User): The user who owns the contacts list.
-            db (Session): A connection to our database, used for querying and deleting data.
+            db (AsyncSession): A connection to our database, used for querying and deleting data.
 
     :param contact_id: int: Identify the contact to be removed
     :param user: User: Get the user id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    stmt = delete(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).returning(Contact)
+    contact = await db.execute(stmt)
+    contact = contact.scalars().first()
     if contact:
-        db.delete(contact)
-        db.commit()
+        await db.commit()
+        await contacts_version.bump(user.id)
     return contact
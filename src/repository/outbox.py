@@ -0,0 +1,78 @@
+from typing import List
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import EmailOutbox
+
+
+def add_confirmation_email(email: str, username: str, host: str, db: AsyncSession) -> EmailOutbox:
+    """
+    The add_confirmation_email function adds a confirmation email to the outbox without committing,
+    so it is stored in the same transaction as the change that requires it.
+
+    :param email: str: The email address of the recipient
+    :param username: str: The username used in the greeting
+    :param host: str: The base url used in the confirmation link
+    :param db: AsyncSession: Access the database
+    :return: The new outbox entry
+    """
+    entry = EmailOutbox(email=email, username=username, host=host)
+    db.add(entry)
+    return entry
+
+
+async def create_confirmation_email(email: str, username: str, host: str, db: AsyncSession) -> EmailOutbox:
+    """
+    The create_confirmation_email function stores a confirmation email in the outbox and commits it.
+
+    :param email: str: The email address of the recipient
+    :param username: str: The username used in the greeting
+    :param host: str: The base url used in the confirmation link
+    :param db: AsyncSession: Access the database
+    :return: The new outbox entry
+    """
+    entry = add_confirmation_email(email, username, host, db)
+    await db.commit()
+    return entry
+
+
+async def claim_emails(limit: int, db: AsyncSession) -> List[EmailOutbox]:
+    """
+    The claim_emails function locks up to limit unsent emails that are due, oldest first.
+    SELECT ... FOR UPDATE SKIP LOCKED lets several workers claim disjoint batches concurrently;
+    the rows stay locked until the transaction is committed by complete_emails.
+
+    :param limit: int: The maximal number of emails to claim
+    :param db: AsyncSession: Access the database
+    :return: A list of claimed outbox entries
+    """
+    stmt = select(EmailOutbox).filter(EmailOutbox.sent_at.is_(None),
+                                      EmailOutbox.attempts < settings.outbox_max_attempts,
+                                      EmailOutbox.available_at <= datetime.now()) \
+        .order_by(EmailOutbox.id).limit(limit).with_for_update(skip_locked=True)
+    entries = await db.execute(stmt)
+    return entries.scalars().all()
+
+
+async def complete_emails(entries: List[EmailOutbox], errors: List[str | None], db: AsyncSession) -> None:
+    """
+    The complete_emails function marks the sent emails of a claimed batch and reschedules the failed ones
+    with exponential backoff, then commits and releases the locks.
+
+    :param entries: List[EmailOutbox]: The claimed outbox entries
+    :param errors: List[str | None]: The delivery error of every entry, None if it was sent
+    :param db: AsyncSession: Access the database
+    :return: None
+    """
+    now = datetime.now()
+    for entry, error in zip(entries, errors):
+        if error is None:
+            entry.sent_at = now
+        else:
+            entry.attempts += 1
+            entry.last_error = error[:255]
+            entry.available_at = now + timedelta(seconds=settings.outbox_retry_backoff * 2 ** entry.attempts)
+    await db.commit()
@@ -1,33 +1,36 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
+from src.services.cache import user_cache
 from src.schemas import UserModel
 
 
-async def get_user_by_email(email: str, db: Session) -> User:
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
     """
     The get_user_by_email function takes in an email and a database session,
     and returns the user associated with that email. If no such user exists,
     it will return None.
 
     :param email: str: Specify the email of the user that will be retrieved
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The first user that matches the email address specified in the function
     :doc-author: Trelent
     """
-    return db.query(User).filter(User.email == email).first()
+    user = await db.execute(select(User).filter(User.email == email))
+    return user.scalars().first()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     The create_user function creates a new user in the database.
         Args:
             body (UserModel): The UserModel object containing the data to be inserted into the database.
-            db (Session): The SQLAlchemy Session object used to interact with our PostgreSQL database.
+            db (AsyncSession): The SQLAlchemy Session object used to interact with our PostgreSQL database.
 
     :param body: UserModel: Pass the user's information to the database
-    :param db: Session: Access the database, and the body: usermodel parameter is used to create a new user
+    :param db: AsyncSession: Access the database, and the body: usermodel parameter is used to create a new user
     :return: A user object
     :doc-author: Trelent
     """
@@ -39,52 +42,40 @@ async def create_user(body: UserModel, db: Session) -> User:
         print(e)
     new_user = User(**body.dict(), avatar=avatar)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
-    """
-    The update_token function updates the refresh token for a user.
-
-    :param user: User: Identify the user to update
-    :param token: str | None: Set the refresh token for a user
-    :param db: Session: Access the database
-    :return: None
-    :doc-author: Trelent
-    """
-    user.refresh_token = token
-    db.commit()
-
-
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
 
 
     :param email: str: Get the email of the user that is trying to confirm their account
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: None
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     The update_avatar function updates the avatar of a user.
 
     :param email: Get the user from the database
     :param url: str: Specify the type of data that is being passed into the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The updated user
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
     return user
@@ -1,51 +1,55 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
-from src.services.email import send_email
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
+from src.repository import outbox as repository_outbox
 from src.services.auth import auth_service
+from src.services.refresh_tokens import refresh_tokens
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserModel object as input, which is validated by pydantic.
         If the email address already exists in the database, an HTTP 409 error is raised.
         The password field of the UserModel object is hashed using Argon2 and stored in that form.
         A new user record is created with this information and returned to the client.
+        The confirmation email is written to the outbox in the same transaction and sent by the outbox worker.
 
     :param body: UserModel: Get the user's information from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background queue
     :param request: Request: Get the base url of the server
-    :param db: Session: Pass the database session to the repository
+    :param db: AsyncSession: Pass the database session to the repository
     :return: A dict with the user and a detail message
     :doc-author: Trelent
     """
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
+    # create_user commits the session, so the outbox entry is stored atomically with the user
+    repository_outbox.add_confirmation_email(body.email, body.username, str(request.base_url), db)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
         It takes the username and password from the request body,
         verifies that they are correct, and returns an access token.
+        The refresh token starts a new session in Redis, so logging in writes nothing to the database
+        and other devices of the user stay signed in.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A token, but it doesn't return the user
     :doc-author: Trelent
     """
@@ -54,29 +58,26 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    refresh_token = await refresh_tokens.issue(user.email)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that will allow them
     to confirm their account. The function takes in a RequestEmail object, which contains the email of
     the user who wants to confirm their account. It then checks if there is already a confirmed user with
-    that email address, and if so returns an error message saying that they are already confirmed. If not, it sends
-    an email containing a confirmation link.
+    that email address, and if so returns an error message saying that they are already confirmed. If not, it puts
+    an email containing a confirmation link into the outbox.
 
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks
     :param request: Request: Get the base_url of the request
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A message to the user
     :doc-author: Trelent
     """
@@ -85,38 +86,30 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        await repository_outbox.create_confirmation_email(user.email, user.username, str(request.base_url), db)
     return {"message": "Check your email for confirmation."}
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     The refresh_token function is used to refresh the access token.
         The function takes in a refresh token and returns an access_token, a new refresh_token, and the type of token.
-        If there is no valid user associated with the given email address or if there are any errors during decoding
-        or creating tokens then an HTTPException will be raised.
+        The refresh token is rotated: it can be used once, and using it again revokes its session.
+        If the token is invalid, expired or already used then an HTTPException will be raised.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the header
-    :param db: Session: Access the database
     :return: A json object with the access_token, refresh_token and token type
     :doc-author: Trelent
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
+    payload = await auth_service.decode_refresh_token(credentials.credentials)
+    refresh_token = await refresh_tokens.rotate(payload)
+    access_token = await auth_service.create_access_token(data={"sub": payload['sub']})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
         It takes the token from the URL and uses it to get the user's email address.
@@ -126,7 +119,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
             confirmed_email function which sets the 'confirmed' field of that particular User object
 
     :param token: str: Get the email from the token
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A message to the user that their email has been confirmed
     :doc-author: Trelent
     """
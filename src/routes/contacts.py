@@ -1,106 +1,195 @@
-from typing import List
+from datetime import date
+from functools import partial
+from typing import List, Literal
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
-from src.schemas import ContactModel, ContactResponse
+from src.conf.config import settings
+from src.schemas import ContactModel, ContactPatchModel, ContactResponse, BulkImportResponse
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services import contacts_io
+from src.services.rate_limit import rate_limit, rate_limiter
+from src.services.etag import contacts_etag, not_modified, set_etag
+from src.services.cache import contacts_version, contacts_pages
+from src.services.serialization import dump_rows
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
 
-@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def read_contacts(skip: int = 0, limit: int = 25, db: Session = Depends(get_db),
+@router.get("/", response_model=List[ContactResponse], description=rate_limiter.describe('read_contacts'),
+            dependencies=[Depends(rate_limit)])
+async def read_contacts(request: Request, skip: int = 0,
+                        limit: int = Query(25, ge=1, le=settings.contacts_max_limit),
+                        cursor: str | None = None, db: AsyncSession = Depends(get_db),
                         current_user: User = Depends(auth_service.get_current_user)):
     """
     The read_contacts function returns a list of contacts.
+        Pages can be walked either with skip or with the opaque cursor taken from the X-Next-Cursor
+        response header of the previous page. The header is absent on the last page.
+        Pages are cached in Redis until the user's contacts change.
+        If-None-Match with the ETag of the previous response returns 304 while the contacts are unchanged;
+        every page has its own ETag.
+        Rows are encoded with orjson without being validated by the response model again.
 
+    :param request: Request: Read the If-None-Match header
     :param skip: int: Skip a number of records
     :param limit: int: Limit the number of contacts returned
-    :param db: Session: Get the database session
+    :param cursor: str | None: Continue after the page that returned this cursor
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
-    return contacts
+    last_id = None
+    if cursor is not None:
+        try:
+            last_id = repository_contacts.decode_cursor(cursor)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    version = await contacts_version.get(current_user.id)
+    etag = contacts_etag(current_user, version, 'list', skip, limit, last_id)
+    if cached := not_modified(request, etag):
+        return cached
+    contacts = await contacts_pages.get_or_load(
+        current_user.id, version, ('list', skip, limit, last_id),
+        partial(repository_contacts.get_contacts, skip, limit, current_user, db, cursor=last_id))
+    response = ORJSONResponse(contacts)
+    if len(contacts) == limit:
+        response.headers['X-Next-Cursor'] = repository_contacts.encode_cursor(contacts[-1]['id'])
+    set_etag(response, etag)
+    return response
 
 
-@router.get("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def read_contact_id(contact_id: int, db: Session = Depends(get_db),
+@router.get("/export", response_class=StreamingResponse, description=rate_limiter.describe('export_contacts'),
+            dependencies=[Depends(rate_limit)],
+            responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}})
+async def export_contacts(format: Literal['ndjson', 'csv'] = 'ndjson', db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams all contacts of the current user as NDJSON or CSV.
+        Rows are read from a server-side cursor and serialized while the response is being sent,
+        so the export uses the same memory for any number of contacts.
+
+    :param format: Literal['ndjson', 'csv']: The format of the export
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: A streaming response with the contacts
+    """
+    rows = repository_contacts.stream_contacts(current_user, db)
+    if format == 'csv':
+        return StreamingResponse(contacts_io.export_csv(rows), media_type='text/csv',
+                                 headers={"Content-Disposition": 'attachment; filename="contacts.csv"'})
+    return StreamingResponse(contacts_io.export_ndjson(rows), media_type='application/x-ndjson',
+                             headers={"Content-Disposition": 'attachment; filename="contacts.ndjson"'})
+
+
+@router.get("/{contact_id}", response_model=ContactResponse, description=rate_limiter.describe('read_contact_id'),
+            dependencies=[Depends(rate_limit)])
+async def read_contact_id(contact_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db),
                           current_user: User = Depends(auth_service.get_current_user)):
     """
     The read_contact_id function is a GET request that returns the contact with the given ID.
     If no such contact exists, it raises an HTTP 404 error.
+    If-None-Match with the ETag of the previous response returns 304 without loading the contact while the
+    contacts are unchanged.
 
     :param contact_id: int: Specify the contact id that is passed in the url
-    :param db: Session: Pass the database session to the function
+    :param request: Request: Read the If-None-Match header
+    :param response: Response: Set the ETag header
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the current user from the database
     :return: The contact object
     :doc-author: Trelent
     """
+    etag = contacts_etag(current_user, await contacts_version.get(current_user.id), 'contact', contact_id)
+    cached = not_modified(request, etag)
+    # the ETag of a contact includes the version, which every removal bumps, so a match means the contact
+    # still exists; only If-None-Match: * matches contacts that were never seen
+    if cached is not None and '*' not in request.headers['if-none-match']:
+        return cached
     contact = await repository_contacts.get_contact_by_id(contact_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    if cached is not None:
+        return cached
+    set_etag(response, etag)
     return contact
 
 
 @router.get("/search/{information}", response_model=List[ContactResponse],
-            description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def read_contacts_info(information: str, db: Session = Depends(get_db),
+            description=rate_limiter.describe('read_contacts_info'),
+            dependencies=[Depends(rate_limit)])
+async def read_contacts_info(information: str, skip: int = 0,
+                             limit: int = Query(25, ge=1, le=settings.contacts_max_limit),
+                             db: AsyncSession = Depends(get_db),
                              current_user: User = Depends(auth_service.get_current_user)):
     """
     The read_contacts_info function will return a contact based on the information provided.
         The function takes in an information parameter, which is used to search for a contact.
+        Matches are ranked and paginated with skip and limit, and cached in Redis until the user's contacts change.
         If no contacts are found, then the function returns an HTTP 404 error.
 
     :param information: str: Get the information from the url
-    :param db: Session: Pass the database session to the function
+    :param skip: int: Skip a number of matches
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the current user
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contacts_by_info(information, current_user, db)
+    contact = await contacts_pages.get_or_load(
+        current_user.id, await contacts_version.get(current_user.id), ('search', information, skip, limit),
+        partial(repository_contacts.get_contacts_by_info, information, current_user, db, skip, limit))
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    return ORJSONResponse(contact)
 
 
-@router.get("/get/7-birthdays", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def read_contacts_7days_birthdays(db: Session = Depends(get_db),
+@router.get("/get/7-birthdays", response_model=List[ContactResponse],
+            description=rate_limiter.describe('read_contacts_7days_birthdays'),
+            dependencies=[Depends(rate_limit)])
+async def read_contacts_7days_birthdays(request: Request, days: int = Query(7, ge=1, le=365),
+                                        db: AsyncSession = Depends(get_db),
                                         current_user: User = Depends(auth_service.get_current_user)):
     """
-    The read_contacts_7days_birthdays function returns a list of contacts that have birthdays in the next 7 days.
-        The function takes two parameters: db and current_user.
+    The read_contacts_7days_birthdays function returns a list of contacts that have birthdays in the next days
+    (7 by default), sorted by the next occurrence.
+        The function takes three parameters: days, db and current_user.
         The db parameter is used to access the database, while current_user is used to get information about the user who made this request.
+        The ETag also depends on days and the current date, so a cached list is not reused on the next day.
 
-    :param db: Session: Get the database connection
+    :param request: Request: Read the If-None-Match header
+    :param days: int: The number of days to look ahead
+    :param db: AsyncSession: Get the database connection
     :param current_user: User: Get the current user's id and pass it to the function
-    :return: A list of contacts that have birthdays in the next 7 days
+    :return: A list of contacts that have birthdays in the next days
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts_7days_birthdays(current_user, db)
-    return contacts
+    etag = contacts_etag(current_user, await contacts_version.get(current_user.id), 'birthdays', days,
+                         date.today().isoformat())
+    if cached := not_modified(request, etag):
+        return cached
+    contacts = await repository_contacts.get_contacts_7days_birthdays(current_user, db, days)
+    response = ORJSONResponse(dump_rows(ContactResponse, contacts))
+    set_etag(response, etag)
+    return response
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
-             description='No more than 10 requests per minute',
-             dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
+             description=rate_limiter.describe('create_contact'),
+             dependencies=[Depends(rate_limit)])
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactModel: Validate the request body
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the user that is logged in
     :return: A contactmodel object
     :doc-author: Trelent
@@ -108,9 +197,33 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
     return await repository_contacts.create_contact(body, current_user, db)
 
 
-@router.put("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def update_contact(body: ContactModel, contact_id: int, db: Session = Depends(get_db),
+@router.post("/bulk", response_model=BulkImportResponse, description=rate_limiter.describe('import_contacts'),
+             dependencies=[Depends(rate_limit)],
+             openapi_extra={"requestBody": {"required": True, "content": {
+                 "text/csv": {"schema": {"type": "string"}},
+                 "application/x-ndjson": {"schema": {"type": "string"}}}}})
+async def import_contacts(request: Request, db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function creates many contacts from a CSV (with a header line) or NDJSON request body.
+        The body is read as a stream and inserted in batches, so uploads of any size use the same memory.
+        Rows that fail validation or clash with existing contacts are listed in the report.
+
+    :param request: Request: Read the body stream and its content type
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: User: Get the user that is logged in
+    :return: A report with the numbers of inserted and failed rows and the row errors
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type not in contacts_io.CSV_TYPES + contacts_io.NDJSON_TYPES:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Upload text/csv or application/x-ndjson")
+    return await contacts_io.import_contacts(request.stream(), content_type, current_user, db)
+
+
+@router.put("/{contact_id}", response_model=ContactResponse, description=rate_limiter.describe('update_contact'),
+            dependencies=[Depends(rate_limit)])
+async def update_contact(body: ContactModel, contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
@@ -121,7 +234,7 @@ async def update_contact(body: ContactModel, contact_id: int, db: Session = Depe
 
     :param body: ContactModel: Get the data from the request body
     :param contact_id: int: Identify the contact to be deleted
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :param current_user: User: Get the user that is currently logged in
     :return: A contactmodel object, but the function is not annotated with a return type
     :doc-author: Trelent
@@ -132,15 +245,34 @@ async def update_contact(body: ContactModel, contact_id: int, db: Session = Depe
     return contact
 
 
-@router.delete("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
-               dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def remove_contact(contact_id: int, db: Session = Depends(get_db),
+@router.patch("/{contact_id}", response_model=ContactResponse, description=rate_limiter.describe('patch_contact'),
+              dependencies=[Depends(rate_limit)])
+async def patch_contact(body: ContactPatchModel, contact_id: int, db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The patch_contact function updates only the fields of a contact that are present in the request body.
+
+    :param body: ContactPatchModel: The fields to change
+    :param contact_id: int: Identify the contact to be updated
+    :param db: AsyncSession: Get a database session
+    :param current_user: User: Get the user that is currently logged in
+    :return: The updated contact
+    """
+    contact = await repository_contacts.patch_contact(contact_id, body, current_user, db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return contact
+
+
+@router.delete("/{contact_id}", response_model=ContactResponse, description=rate_limiter.describe('remove_contact'),
+               dependencies=[Depends(rate_limit)])
+async def remove_contact(contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The remove_contact function removes a contact from the database.
 
     :param contact_id: int: Specify the contact to be removed
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the user from the database
     :return: The contact that was removed
     :doc-author: Trelent
@@ -0,0 +1,58 @@
+from secrets import compare_digest
+
+from fastapi import APIRouter, Depends, HTTPException, Response, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from src.conf.config import settings
+
+from src.database.db import get_pool_stats
+from src.services.cache import user_cache, token_cache, contacts_version, contacts_pages
+from src.services.rate_limit import rate_limiter
+from src.services.refresh_tokens import refresh_tokens
+from src.services.metrics import render_metrics
+
+security = HTTPBearer()
+
+
+async def verify_internal_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    The verify_internal_token function lets a request through only if it carries settings.internal_token
+    as its bearer token. Without a configured token every request is refused.
+
+    :param credentials: HTTPAuthorizationCredentials: Get the token from the header
+    :return: None
+    """
+    if not settings.internal_token or not compare_digest(credentials.credentials.encode(),
+                                                         settings.internal_token.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+
+router = APIRouter(prefix='/internal', tags=["internal"], include_in_schema=False,
+                   dependencies=[Depends(verify_internal_token)])
+
+
+@router.get("/stats")
+async def read_stats():
+    """
+    The read_stats function returns the runtime counters of the database connection pool, the application caches,
+    the rate limiter and the refresh token sessions.
+    The route is meant for operators: it requires settings.internal_token and is hidden from the OpenAPI schema.
+
+    :return: A dictionary with the counters of the pool and every cache
+    """
+    return {"db_pool": get_pool_stats(), "user_cache": user_cache.stats(), "token_cache": token_cache.stats(),
+            "contacts_version": contacts_version.stats(),
+            "contacts_pages": contacts_pages.stats(), "rate_limit": rate_limiter.stats(),
+            "refresh_tokens": refresh_tokens.stats()}
+
+
+@router.get("/metrics")
+async def read_metrics():
+    """
+    The read_metrics function returns the request, latency and SQL metrics in the Prometheus text format.
+    Like the other internal routes it requires settings.internal_token, so the scraper must send it as a bearer token.
+
+    :return: The metrics of this process
+    """
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
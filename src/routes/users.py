@@ -1,16 +1,15 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
 from src.schemas import UserDb
+from src.services.avatar import upload_avatar, UploadLimitRoute
+from src.services.storage import avatar_storage
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=UploadLimitRoute)
 
 
 @router.get("/me/", response_model=UserDb)
@@ -27,29 +26,28 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserDb)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_db)):
     """
     The update_avatar_user function is used to update the avatar of a user.
-        The function takes in an UploadFile object, which contains the file that will be uploaded to Cloudinary.
+        The function takes in an UploadFile object, which contains the image that will become the avatar.
+        The image is read with a size cap, cropped and resized to 250x250 in a worker thread and saved to
+        the configured avatar storage (Cloudinary or the local file system) without blocking the event loop.
+        The avatar is stored under the user id, because usernames are free text and not unique.
+        The previous avatar is deleted from the storage after the new url is saved.
         It also takes in a User object, which is obtained from auth_service.get_current_user(). This ensures that only
         authenticated users can access this endpoint and change their own avatars (and not anyone else's). Finally, it
         takes in a Session object for database access.
 
     :param file: UploadFile: Get the file from the request body
     :param current_user: User: Get the current user from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A user with an updated avatar url
     :doc-author: Trelent
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'ContactsApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'ContactsApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    old_url = current_user.avatar
+    src_url = await upload_avatar(file, str(current_user.id), avatar_storage)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
+    # the old image is only removed once the new url is committed, so a failed update keeps a working avatar
+    if old_url and old_url != src_url:
+        await avatar_storage.delete(old_url)
     return user
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, EmailStr
 
@@ -11,6 +12,14 @@ class ContactModel(BaseModel):
     birthday: datetime
 
 
+class ContactPatchModel(BaseModel):
+    firstname: Optional[str] = Field(None, min_length=1, max_length=50)
+    lastname: Optional[str] = Field(None, min_length=1, max_length=50)
+    email: Optional[EmailStr]
+    phone: Optional[str] = Field(None, min_length=7, max_length=20)
+    birthday: Optional[datetime]
+
+
 class ContactResponse(BaseModel):
     id: int
     firstname: str = Field(min_length=1, max_length=50)
@@ -25,6 +34,17 @@ class ContactResponse(BaseModel):
         orm_mode = True
 
 
+class BulkImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class BulkImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
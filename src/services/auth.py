@@ -1,28 +1,76 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from time import monotonic
 from typing import Optional
 
-from jose import JWTError, jwt
+from jose import JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.services.cache import user_cache, token_cache
 from src.conf.config import settings
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix='bcrypt')
+    hash_pending = 0
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-    def verify_password(self, plain_password, hashed_password):
+    # passlib and jose.jwt (with its cryptography backend) are imported on first use, not when the app is imported
+    @cached_property
+    def pwd_context(self):
+        from passlib.context import CryptContext
+        return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+
+    @cached_property
+    def jwt(self):
+        from jose import jwt
+        return jwt
+
+    async def run_password_job(self, func, *args):
+        """
+        The run_password_job function runs a bcrypt call on the hash_executor thread pool, so the event loop
+        keeps serving other clients while the password is hashed. At most password_hash_max_pending jobs may
+        wait or run at once, and a job that waited in the queue longer than password_hash_queue_timeout seconds
+        is dropped. In both cases the client gets 503 instead of an ever-growing latency.
+
+        :param self: Represent the instance of the class
+        :param func: The blocking passlib function to call
+        :param args: The arguments of the function
+        :return: The result of the function
+        """
+        busy_exception = HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                       detail="Server is busy, try again later", headers={"Retry-After": "1"})
+        if Auth.hash_pending >= settings.password_hash_max_pending:
+            raise busy_exception
+        submitted = monotonic()
+
+        def job():
+            if monotonic() - submitted > settings.password_hash_queue_timeout:
+                return busy_exception
+            return func(*args)
+
+        Auth.hash_pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.hash_executor, job)
+        finally:
+            Auth.hash_pending -= 1
+        if result is busy_exception:
+            raise busy_exception
+        return result
+
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
-        plain-text password matches the hashed one.
+        plain-text password matches the hashed one. The check runs on the password thread pool.
 
         :param self: Represent the instance of the class
         :param plain_password: Verify the password that is entered by the user
@@ -30,19 +78,20 @@ class Auth:
         :return: True or false depending on whether the password is correct
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.run_password_job(self.pwd_context.verify, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
-        The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
+        The hash is generated using the pwd_context object on the password thread pool,
+        with the number of bcrypt rounds taken from settings.
 
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that is being hashed
         :return: A hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await self.run_password_job(self.pwd_context.hash, password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -65,7 +114,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_access_token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
     # define a function to generate a new refresh token
@@ -86,9 +135,9 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
     def create_email_token(self, data: dict):
@@ -105,7 +154,7 @@ class Auth:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "email_token"})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
 
     def get_email_from_token(self, token: str):
@@ -122,7 +171,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'email_token':
                 email = payload['sub']
                 return email
@@ -135,33 +184,34 @@ class Auth:
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
-        It takes a refresh_token as an argument and returns the email of the user if it's valid.
+        It takes a refresh_token as an argument and returns its claims if it's valid.
         If not, it raises an HTTPException with status code 401 (UNAUTHORIZED) and detail 'Could not validate credentials'.
 
 
         :param self: Represent the instance of a class
         :param refresh_token: str: Pass the refresh token to the function
-        :return: The email of the user who is trying to refresh their access token
+        :return: The claims of the token: the email of the user (sub), its rotation family (fam) and id (jti)
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             protected endpoints. It takes a token as an argument and returns the user
             if it's valid, or raises an exception otherwise.
+            Verified access token payloads are kept in token_cache, so a repeated token skips jwt.decode.
+            The user is served from user_cache when possible and only loaded from the database on a miss.
 
         :param self: Access the class attributes
         :param token: str: Get the token from the authorization header
-        :param db: Session: Pass the database connection to the function
+        :param db: AsyncSession: Pass the database connection to the function
         :return: The user object from the database
         :doc-author: Trelent
         """
@@ -171,21 +221,29 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+        payload = token_cache.get(token)
+        if payload is None:
+            try:
+                # Decode JWT
+                payload = self.jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            except JWTError as e:
                 raise credentials_exception
-        except JWTError as e:
+            if payload.get('scope') == 'access_token':
+                token_cache.set(token, payload)
+        if payload.get('scope') == 'access_token':
+            email = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        else:
             raise credentials_exception
 
-        user = await repository_users.get_user_by_email(email, db)
+        user = await user_cache.get(email)
         if user is None:
-            raise credentials_exception
+            generation = await user_cache.generation(email)
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise credentials_exception
+            await user_cache.set(user, generation)
         return user
 
 
@@ -0,0 +1,110 @@
+from io import BytesIO
+from typing import Callable
+
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Message
+
+from src.conf.config import settings
+from src.services.storage import AvatarStorage
+
+CHUNK_SIZE = 64 * 1024
+# Room for the multipart boundaries and part headers around the uploaded file
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Route that refuses request bodies larger than settings.avatar_max_size plus UPLOAD_OVERHEAD bytes before the
+    form is parsed. Starlette spools a multipart upload to a temporary file before the endpoint runs, so only a
+    limit on the received body keeps an oversized upload from being received and written to disk completely.
+    The declared Content-Length is checked first, and the received bytes are counted for bodies without one.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            max_size = settings.avatar_max_size + UPLOAD_OVERHEAD
+            too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                      detail=f"Request body must not be larger than {max_size} bytes")
+            content_length = request.headers.get('content-length', '')
+            if content_length.isdigit() and int(content_length) > max_size:
+                raise too_large
+            received = 0
+
+            async def receive() -> Message:
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get('body', b''))
+                if received > max_size:
+                    raise too_large
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+
+async def read_upload(file: UploadFile, max_size: int) -> bytes:
+    """
+    The read_upload function reads the spooled upload back chunk by chunk and stops as soon as it grows over
+    max_size, so an oversized file is never loaded into memory. The size of the received body is limited
+    by UploadLimitRoute before the form is parsed.
+
+    :param file: UploadFile: The uploaded file
+    :param max_size: int: The maximal size in bytes
+    :return: The content of the file
+    """
+    buffer = BytesIO()
+    while chunk := await file.read(CHUNK_SIZE):
+        if buffer.tell() + len(chunk) > max_size:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"Avatar must not be larger than {max_size} bytes")
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def process_avatar(data: bytes, size: int, max_side: int) -> bytes:
+    """
+    The process_avatar function crops the image to a centered square, resizes it to size x size and encodes it as PNG.
+    It is CPU bound and must run outside the event loop. The dimensions are checked from the header before the
+    pixels are decoded, since a small compressed file can hold an image that takes hundreds of MB to decode.
+
+    :param data: bytes: The uploaded image
+    :param size: int: The side of the avatar in pixels
+    :param max_side: int: The largest width or height of an accepted image in pixels
+    :return: The encoded avatar
+    """
+    # Pillow is only needed by avatar uploads, so it is imported by the first one
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if max(image.size) > max_side:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Image must not be larger than {max_side}x{max_side} pixels")
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image).convert('RGBA')
+            avatar = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image")
+    output = BytesIO()
+    avatar.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+async def upload_avatar(file: UploadFile, name: str, storage: AvatarStorage) -> str:
+    """
+    The upload_avatar function reads the upload with a size cap, processes it in a worker thread
+    and stores the small result, so the event loop is never blocked.
+
+    :param file: UploadFile: The uploaded image
+    :param name: str: The name of the avatar, the id of the user
+    :param storage: AvatarStorage: Where the avatar is stored
+    :return: The public url of the avatar
+    """
+    data = await read_upload(file, settings.avatar_max_size)
+    avatar = await run_in_threadpool(process_avatar, data, settings.avatar_size, settings.avatar_max_side)
+    return await storage.save(name, avatar)
@@ -0,0 +1,429 @@
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Type
+from datetime import datetime
+from hashlib import sha256
+from secrets import token_hex
+from time import monotonic, perf_counter, time
+
+import orjson
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.models import User
+from src.schemas import ContactResponse
+from src.services.serialization import dump_rows
+
+# Stores a user only if nobody invalidated it since its row was read, so a stale row cannot be written back
+# after the change that made it stale.
+SET_USER_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+INVALIDATE_USER_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[1])
+"""
+
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users keyed by email: a small in-process LRU with a short TTL
+    in front of Redis. Only the fields needed by the protected routes are cached, never the password
+    hash or the refresh token. Redis is optional and any Redis error falls back to the database.
+    Every invalidation increments a per-user generation, and a user read before it is not stored.
+    """
+    FIELDS = ('id', 'username', 'email', 'created_at', 'avatar', 'confirmed')
+
+    def __init__(self, maxsize: int, local_ttl: int, ttl: int):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.redis: Redis | None = None
+        self.set_script = None
+        self.invalidate_script = None
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def init(self, redis: Redis):
+        """
+        The init function connects the cache to Redis. Until it is called only the in-process tier is used.
+
+        :param self: Represent the instance of the class
+        :param redis: Redis: The client created at application startup
+        :return: None
+        """
+        self.redis = redis
+        self.set_script = redis.register_script(SET_USER_SCRIPT)
+        self.invalidate_script = redis.register_script(INVALIDATE_USER_SCRIPT)
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f'user:{email}'
+
+    @staticmethod
+    def _generation_key(email: str) -> str:
+        return f'user_generation:{email}'
+
+    @staticmethod
+    def _dump(user: User) -> dict:
+        data = {field: getattr(user, field) for field in UserCache.FIELDS}
+        data['created_at'] = data['created_at'].isoformat() if data['created_at'] else None
+        return data
+
+    @staticmethod
+    def _load(data: dict) -> User:
+        data = dict(data)
+        data['created_at'] = datetime.fromisoformat(data['created_at']) if data['created_at'] else None
+        return User(**data)
+
+    def _store_local(self, email: str, data: dict):
+        self._local[email] = (monotonic() + self.local_ttl, data)
+        self._local.move_to_end(email)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+    async def get(self, email: str) -> User | None:
+        """
+        The get function looks the user up in the in-process tier first and then in Redis.
+        A fresh detached User object is built on every hit, so requests never share an instance.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: The cached user or None on a miss
+        """
+        entry = self._local.get(email)
+        if entry is not None:
+            if entry[0] > monotonic():
+                self._local.move_to_end(email)
+                self.local_hits += 1
+                return self._load(entry[1])
+            del self._local[email]
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(email))
+            except RedisError:
+                raw = None
+            if raw:
+                data = json.loads(raw)
+                self._store_local(email, data)
+                self.redis_hits += 1
+                return self._load(data)
+        self.misses += 1
+        return None
+
+    async def generation(self, email: str) -> tuple[int, str | None]:
+        """
+        The generation function returns the current generation of the user in both tiers.
+        It must be read before the users row, and passed to set together with the loaded user.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: The local generation and the Redis one, None if Redis is unavailable
+        """
+        remote = None
+        if self.redis is not None:
+            try:
+                remote = await self.redis.get(self._generation_key(email)) or '0'
+            except RedisError:
+                pass
+        return self._generations.get(email, 0), remote
+
+    async def set(self, user: User, generation: tuple[int, str | None]):
+        """
+        The set function stores the user in both tiers, unless the user was invalidated after the generation was read.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user loaded from the database
+        :param generation: tuple[int, str | None]: The generation read before loading the user
+        :return: None
+        """
+        local, remote = generation
+        if self._generations.get(user.email, 0) != local:
+            return
+        data = self._dump(user)
+        if self.redis is not None and remote is not None:
+            try:
+                stored = await self.set_script(keys=[self._key(user.email), self._generation_key(user.email)],
+                                               args=[remote, json.dumps(data), self.ttl])
+            except RedisError:
+                stored = True
+            if not stored:
+                return
+        self._store_local(user.email, data)
+
+    async def invalidate(self, email: str):
+        """
+        The invalidate function drops the user from both tiers and increments its generation.
+        It must be called after every change of the users row.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the changed user
+        :return: None
+        """
+        self._local.pop(email, None)
+        self._generations[email] = self._generations.get(email, 0) + 1
+        if self.redis is not None:
+            try:
+                await self.invalidate_script(keys=[self._key(email), self._generation_key(email)], args=[self.ttl])
+            except RedisError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the hit and miss counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"local_hits": self.local_hits, "redis_hits": self.redis_hits, "misses": self.misses,
+                "local_size": len(self._local)}
+
+
+class TokenCache:
+    """
+    Bounded in-process LRU of already verified JWT payloads keyed by the SHA-256 of the token,
+    so a bearer token presented again skips the signature check. Every entry expires at the token's exp claim.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._payloads: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        The get function returns the verified payload of the token if it is cached and not expired yet.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :return: The decoded payload or None on a miss
+        """
+        key = self._key(token)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            if payload['exp'] > time():
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            del self._payloads[key]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, payload: dict):
+        """
+        The set function stores the payload of a token whose signature and claims have just been verified.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :param payload: dict: The payload returned by jwt.decode
+        :return: None
+        """
+        if 'exp' not in payload:
+            return
+        key = self._key(token)
+        self._payloads[key] = payload
+        self._payloads.move_to_end(key)
+        while len(self._payloads) > self.maxsize:
+            self._payloads.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the hit and miss counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._payloads)}
+
+
+class ContactsVersion:
+    """
+    Opaque per-user version of the contacts list, replaced with a new random token after every write.
+    Random tokens rather than a counter keep old versions from being reused if Redis loses the key.
+    Without Redis the versions are kept in process; if Redis fails the version is unknown (None).
+    A bump that fails after a committed write is retried by the next call of this process. Until it succeeds
+    the version of that user is unknown here, so no ETag or cached page can outlive the write.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.redis: Redis | None = None
+        self._local: dict[int, str] = {}
+        self._pending: set[int] = set()
+        self.bump_failures = 0
+
+    def init(self, redis: Redis):
+        """
+        The init function connects the versions to Redis so that all workers share them.
+
+        :param self: Represent the instance of the class
+        :param redis: Redis: The client created at application startup
+        :return: None
+        """
+        self.redis = redis
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f'contacts_version:{user_id}'
+
+    async def _retry_pending(self):
+        try:
+            for user_id in list(self._pending):
+                await self.redis.set(self._key(user_id), token_hex(8), ex=self.ttl)
+                self._pending.discard(user_id)
+        except RedisError:
+            pass
+
+    async def get(self, user_id: int) -> str | None:
+        """
+        The get function returns the current version of the user's contacts, creating one if there is none.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The id of the user
+        :return: The version or None if it is unknown
+        """
+        if self.redis is None:
+            return self._local.setdefault(user_id, token_hex(8))
+        if self._pending:
+            await self._retry_pending()
+            if user_id in self._pending:
+                return None
+        version = token_hex(8)
+        try:
+            # a single SET NX GET (Redis 7) returns the current version or creates it if there is none
+            current = await self.redis.set(self._key(user_id), version, ex=self.ttl, nx=True, get=True)
+        except RedisError:
+            return None
+        return version if current is None else current
+
+    async def bump(self, user_id: int):
+        """
+        The bump function replaces the version of the user's contacts. It must be called after every committed write.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The id of the user whose contacts changed
+        :return: None
+        """
+        if self.redis is None:
+            self._local[user_id] = token_hex(8)
+            return
+        if self._pending:
+            await self._retry_pending()
+        try:
+            await self.redis.set(self._key(user_id), token_hex(8), ex=self.ttl)
+            self._pending.discard(user_id)
+        except RedisError:
+            self._pending.add(user_id)
+            self.bump_failures += 1
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the number of failed bumps and of users whose bump is still to be retried.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"bump_failures": self.bump_failures, "pending": len(self._pending)}
+
+
+class PageCache:
+    """
+    Read-through cache of serialized contact pages in Redis. Every key lives in a per-user namespace that
+    includes the contacts version, so a write makes all cached pages of the user unreachable at once and
+    they expire after ttl seconds. A page loaded before a write can only be stored under the old version,
+    which is never read again. Without Redis or a known version, pages are always loaded from the database.
+    """
+
+    def __init__(self, model: Type[BaseModel], ttl: int):
+        self.model = model
+        self.ttl = ttl
+        self.redis: Redis | None = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.hit_time = 0.0
+        self.miss_time = 0.0
+
+    def init(self, redis: Redis):
+        """
+        The init function connects the cache to Redis. Until it is called every page is loaded from the database.
+
+        :param self: Represent the instance of the class
+        :param redis: Redis: The client created at application startup
+        :return: None
+        """
+        self.redis = redis
+
+    @staticmethod
+    def _key(user_id: int, version: str, params: tuple) -> str:
+        digest = sha256(json.dumps(params, default=str).encode()).hexdigest()[:32]
+        return f'contacts_page:{user_id}:{version}:{digest}'
+
+    async def get_or_load(self, user_id: int, version: str | None, params: tuple,
+                          load: Callable[[], Awaitable[list]]) -> list[dict]:
+        """
+        The get_or_load function returns the cached page or loads it, copies the fields of the model and caches it.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The owner of the contacts
+        :param version: str | None: The contacts version read before loading
+        :param params: tuple: The name of the query and its arguments
+        :param load: Callable[[], Awaitable[list]]: Loads the page from the database
+        :return: The page as a list of dictionaries for ORJSONResponse
+        """
+        if self.redis is None or version is None:
+            return dump_rows(self.model, await load())
+        start = perf_counter()
+        key = self._key(user_id, version, params)
+        try:
+            raw = await self.redis.get(key)
+        except RedisError:
+            self.errors += 1
+            raw = None
+        if raw is not None:
+            self.hits += 1
+            self.hit_time += perf_counter() - start
+            return orjson.loads(raw)
+        page = dump_rows(self.model, await load())
+        try:
+            await self.redis.set(key, orjson.dumps(page), ex=self.ttl)
+        except RedisError:
+            self.errors += 1
+        self.misses += 1
+        self.miss_time += perf_counter() - start
+        return page
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the hit ratio and the average latency of hits and misses in milliseconds.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "avg_hit_ms": self.hit_time * 1000 / self.hits if self.hits else 0.0,
+                "avg_miss_ms": self.miss_time * 1000 / self.misses if self.misses else 0.0}
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_local_ttl, settings.user_cache_ttl)
+token_cache = TokenCache(settings.token_cache_size)
+contacts_version = ContactsVersion(settings.contacts_version_ttl)
+contacts_pages = PageCache(ContactResponse, settings.contacts_page_cache_ttl)
@@ -0,0 +1,200 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+CSV_TYPES = ('text/csv', 'application/csv')
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    The iter_lines function splits a stream of UTF-8 byte chunks into lines without reading the whole stream.
+    Only the current unfinished line is kept in memory.
+
+    :param chunks: AsyncIterator[bytes]: The raw request body
+    :return: An async iterator of lines without line terminators
+    :raises ValueError: If a line is longer than settings.bulk_import_max_line
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    tail = ''
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split('\n')
+        tail = lines.pop()
+        if len(tail) > settings.bulk_import_max_line:
+            raise ValueError('Line is too long')
+        for line in lines:
+            yield line.rstrip('\r')
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail.rstrip('\r')
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    """
+    The iter_csv function reads CSV rows with a header line from a byte stream.
+    Quoted fields may contain line breaks.
+
+    :param chunks: AsyncIterator[bytes]: The raw request body
+    :return: An async iterator of (row number, row, error) tuples
+    """
+    header = None
+    record = None
+    number = 0
+    async for line in iter_lines(chunks):
+        record = line if record is None else f'{record}\n{line}'
+        if record.count('"') % 2:
+            if len(record) > settings.bulk_import_max_line:
+                raise ValueError('Line is too long')
+            continue
+        values, record = next(csv.reader([record]), []), None
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        number += 1
+        if len(values) != len(header):
+            yield number, None, f'Expected {len(header)} columns, got {len(values)}'
+            continue
+        yield number, dict(zip(header, values)), None
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    """
+    The iter_ndjson function reads one JSON object per line from a byte stream. Blank lines are skipped.
+
+    :param chunks: AsyncIterator[bytes]: The raw request body
+    :return: An async iterator of (row number, row, error) tuples
+    """
+    number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as err:
+            yield number, None, f'Invalid JSON: {err.msg}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, row, None
+
+
+async def import_contacts(chunks: AsyncIterator[bytes], content_type: str, user: User, db: AsyncSession) -> dict:
+    """
+    The import_contacts function validates streamed CSV or NDJSON rows with ContactModel and inserts them
+    in batches of settings.bulk_import_batch_size. Memory use depends on the batch size only, never on the
+    size of the upload. At most settings.bulk_import_max_errors row errors are reported, the rest are counted.
+
+    :param chunks: AsyncIterator[bytes]: The raw request body
+    :param content_type: str: The media type of the body
+    :param user: User: The owner of the new contacts
+    :param db: AsyncSession: Access the database
+    :return: A report with the numbers of inserted and failed rows and the row errors
+    :raises ValueError: If the media type is not supported
+    """
+    if content_type in CSV_TYPES:
+        rows = iter_csv(chunks)
+    elif content_type in NDJSON_TYPES:
+        rows = iter_ndjson(chunks)
+    else:
+        raise ValueError(f'Unsupported content type: {content_type}')
+
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    def fail(number: int, detail: str):
+        report["failed"] += 1
+        if len(report["errors"]) < settings.bulk_import_max_errors:
+            report["errors"].append({"row": number, "detail": detail})
+
+    async def flush(batch: List[Tuple[int, ContactModel]]):
+        inserted = set(await repository_contacts.create_contacts([body for _, body in batch], user, db))
+        for number, body in batch:
+            if body.phone in inserted:
+                inserted.discard(body.phone)
+                report["inserted"] += 1
+            else:
+                fail(number, 'Contact with this phone or email already exists')
+
+    batch = []
+    number = 0
+    try:
+        async for number, row, error in rows:
+            if error is not None:
+                fail(number, error)
+                continue
+            try:
+                batch.append((number, ContactModel(**row)))
+            except ValidationError as err:
+                fail(number, '; '.join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors()))
+                continue
+            if len(batch) >= settings.bulk_import_batch_size:
+                await flush(batch)
+                batch = []
+    except ValueError as err:
+        fail(number + 1, f'{err}, import stopped')
+    if batch:
+        await flush(batch)
+    return report
+
+
+EXPORT_FIELDS = tuple(column.key for column in repository_contacts.EXPORT_COLUMNS)
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def export_ndjson(rows: AsyncIterator[Row]) -> AsyncIterator[bytes]:
+    """
+    The export_ndjson function serializes rows to NDJSON, one JSON object per line.
+    Lines are sent in chunks of settings.export_batch_size rows.
+
+    :param rows: AsyncIterator[Row]: The rows of EXPORT_FIELDS
+    :return: An async iterator of body chunks
+    """
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_FIELDS, map(_export_value, row)))))
+        if len(lines) >= settings.export_batch_size:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+async def export_csv(rows: AsyncIterator[Row]) -> AsyncIterator[bytes]:
+    """
+    The export_csv function serializes rows to CSV with a header line, in the format accepted by the bulk import.
+    Lines are sent in chunks of settings.export_batch_size rows.
+
+    :param rows: AsyncIterator[Row]: The rows of EXPORT_FIELDS
+    :return: An async iterator of body chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    async for row in rows:
+        writer.writerow(map(_export_value, row))
+        count += 1
+        if count >= settings.export_batch_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield buffer.getvalue().encode()
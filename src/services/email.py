@@ -1,51 +1,201 @@
+import logging
+from email.message import Message
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from functools import lru_cache
 from pathlib import Path
+from time import monotonic
+from typing import TYPE_CHECKING, Iterable, Iterator, Tuple
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from aiosmtplib import SMTP, SMTPException, SMTPRecipientsRefused
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import settings
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=EmailStr(settings.mail_from),
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Evpatiy Kolovrat",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
-
-
-async def send_email(email: EmailStr, username: str, host: str):
-    """
-    The send_email function sends an email to the user with a link to confirm their email address.
-        The function takes in three parameters:
-            -email: EmailStr, the user's email address.
-            -username: str, the username of the user who is registering for an account.  This will be used in a greeting message within the body of the email sent to them.
-            -host: str, this is where we are hosting our application (i.e., localhost).  This will be used as part of a URL that they can click on within their browser.
+if TYPE_CHECKING:
+    from fastapi_mail import ConnectionConfig
+    from jinja2 import Environment, Template
+
+logger = logging.getLogger(__name__)
+
+MAIL_FROM_NAME = "Evpatiy Kolovrat"
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+
+@lru_cache
+def get_mail_config() -> 'ConnectionConfig':
+    """
+    The get_mail_config function builds the SMTP connection config of the application on first use.
+    fastapi_mail pulls in httpx and is the slowest import of the app, so it is not imported until mail is sent.
+
+    :return: The connection config
+    """
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.mail_username,
+        MAIL_PASSWORD=settings.mail_password,
+        MAIL_FROM=EmailStr(settings.mail_from),
+        MAIL_PORT=settings.mail_port,
+        MAIL_SERVER=settings.mail_server,
+        MAIL_FROM_NAME=MAIL_FROM_NAME,
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=True,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TEMPLATE_FOLDER=TEMPLATE_FOLDER,
+    )
+
+
+class MailWorker:
+    """
+    Mail sender of the outbox worker. The outbox table is the queue of emails, and it is also the retry
+    mechanism: every send is tried once and its error is returned, so the outbox schedules the email again
+    after outbox_retry_backoff. One SMTP connection is kept open between calls and replaced once it has been
+    idle for idle_timeout seconds or a send failed on it.
+    """
+
+    def __init__(self, config: 'ConnectionConfig', idle_timeout: float):
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self._smtp: SMTP | None = None
+        self._used = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+
+    async def _connect(self) -> SMTP:
+        smtp = SMTP(hostname=self.config.MAIL_SERVER, port=self.config.MAIL_PORT, use_tls=self.config.MAIL_SSL_TLS,
+                    start_tls=self.config.MAIL_STARTTLS, validate_certs=self.config.VALIDATE_CERTS,
+                    timeout=self.config.TIMEOUT)
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        self.connections += 1
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: SMTP | None) -> None:
+        if smtp is None or not smtp.is_connected:
+            return None
+        try:
+            await smtp.quit()
+        except (SMTPException, OSError):
+            smtp.close()
+        return None
+
+    async def _deliver(self, smtp: SMTP | None, batch: list[Message]) -> tuple[SMTP | None, list[str | None]]:
+        errors = []
+        for message in batch:
+            error = None
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+            except SMTPRecipientsRefused as err:
+                error = str(err)
+            except (SMTPException, OSError) as err:
+                error = str(err)
+                smtp = await self._close(smtp)
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+                logger.warning("Could not send email to %s: %s", message["To"], error)
+            errors.append(error)
+        return smtp, errors
+
+    async def deliver(self, messages: list[Message]) -> list[str | None]:
+        """
+        The deliver function sends the messages over the connection kept open between calls
+        and reports the outcome of every message.
+
+        :param self: Represent the instance of the class
+        :param messages: list[Message]: The messages to send
+        :return: The delivery error of every message, None if it was sent
+        """
+        if monotonic() - self._used > self.idle_timeout:
+            self._smtp = await self._close(self._smtp)
+        self._smtp, errors = await self._deliver(self._smtp, messages)
+        self._used = monotonic()
+        return errors
+
+    async def close(self):
+        """
+        The close function closes the connection used by deliver.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._smtp = await self._close(self._smtp)
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the delivery counters of the worker.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"sent": self.sent, "failed": self.failed, "connections": self.connections}
+
+
+CONFIRMATION_SUBJECT = "Confirm your email "
+CONFIRMATION_TEMPLATE = "email_template.html"
+
+
+@lru_cache
+def get_template_env() -> 'Environment':
+    """
+    The get_template_env function creates the jinja2 environment of the email templates on first use.
+
+    :return: The template environment
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    return Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), auto_reload=False)
+
+
+@lru_cache
+def get_template(template_name: str) -> 'Template':
+    """
+    The get_template function loads and compiles a template from the templates folder once;
+    later calls return the same compiled template without touching the file system.
+
+    :param template_name: str: The file name of the template
+    :return: The compiled template
+    """
+    return get_template_env().get_template(template_name)
+
+
+def render_emails(recipients: Iterable[Tuple[str, dict]], subject: str,
+                  template_name: str = CONFIRMATION_TEMPLATE) -> Iterator[Message]:
+    """
+    The render_emails function renders one compiled template for many recipients and yields ready to send messages.
+    Messages are built as compat32 MIMEText, which is several times cheaper than EmailMessage.set_content.
+
+    :param recipients: Iterable[Tuple[str, dict]]: Pairs of the recipient address and its template_body
+    :param subject: str: The subject of every message
+    :param template_name: str: The file name of the template
+    :return: An iterator of messages
+    """
+    template = get_template(template_name)
+    sender = formataddr((MAIL_FROM_NAME, settings.mail_from))
+    for email, template_body in recipients:
+        message = MIMEText(template.render(**template_body), "html", "utf-8")
+        message["Subject"] = subject
+        message["From"] = sender
+        message["To"] = email
+        yield message
+
+
+def confirmation_body(email: EmailStr, username: str, host: str) -> dict:
+    """
+    The confirmation_body function builds the template_body of the confirmation email with a fresh email token.
 
     :param email: EmailStr: Specify the email address of the recipient
     :param username: str: Pass the username of the user to be registered
     :param host: str: Create the link in the email
-    :return: A coroutine that can be awaited
-    :doc-author: Trelent
-    """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    :return: The template variables
+    """
+    return {"host": host, "username": username, "token": auth_service.create_email_token({"sub": email})}
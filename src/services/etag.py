@@ -0,0 +1,52 @@
+from fastapi import Request, Response, status
+
+from src.database.models import User
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def contacts_etag(user: User, version: str | None, *parts) -> str | None:
+    """
+    The contacts_etag function builds a weak ETag for a response made from the user's contacts.
+    It changes whenever the user creates, updates or removes a contact; parts add inputs that change
+    the response without a write, such as the current date.
+
+    :param user: User: The owner of the contacts
+    :param version: str | None: The contacts version from contacts_version
+    :param parts: Extra values the response depends on
+    :return: The ETag or None if the version of the contacts is unknown
+    """
+    if version is None:
+        return None
+    return 'W/"' + '-'.join(map(str, (user.id, version, *parts))) + '"'
+
+
+def not_modified(request: Request, etag: str | None) -> Response | None:
+    """
+    The not_modified function compares the If-None-Match header of the request with the current ETag
+    using the weak comparison of RFC 9110.
+
+    :param request: Request: The conditional request
+    :param etag: str | None: The current ETag
+    :return: An empty 304 response if the client's copy is current, otherwise None
+    """
+    header = request.headers.get('if-none-match')
+    if etag is None or header is None:
+        return None
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    if '*' in tags or etag.removeprefix('W/') in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def set_etag(response: Response, etag: str | None):
+    """
+    The set_etag function adds the ETag to a full response and asks clients to revalidate it before reuse.
+
+    :param response: Response: The response of the route
+    :param etag: str | None: The current ETag
+    :return: None
+    """
+    if etag is not None:
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = CACHE_CONTROL
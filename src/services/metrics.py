@@ -0,0 +1,132 @@
+from contextvars import ContextVar
+from time import perf_counter
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+registry = CollectorRegistry(auto_describe=True)
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time to answer a request, including the body',
+                             ('method', 'route'), registry=registry,
+                             buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10))
+REQUESTS = Counter('http_requests', 'Answered requests', ('method', 'route', 'status'), registry=registry)
+IN_PROGRESS = Gauge('http_requests_in_progress', 'Requests being answered', ('method',), registry=registry)
+REQUEST_QUERIES = Histogram('db_queries_per_request', 'SQL statements executed by a request', ('method', 'route'),
+                            registry=registry, buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+REQUEST_QUERY_TIME = Histogram('db_query_seconds_per_request', 'Time spent in SQL statements by a request',
+                               ('method', 'route'), registry=registry,
+                               buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+QUERIES = Counter('db_queries', 'Executed SQL statements', registry=registry)
+
+UNMATCHED = 'unmatched'
+
+
+class QueryStats:
+    __slots__ = ('count', 'time', 'started')
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.started = 0.0
+
+
+current_queries: ContextVar[QueryStats | None] = ContextVar('current_queries', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_queries.get()
+    if stats is not None:
+        stats.started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    QUERIES.inc()
+    stats = current_queries.get()
+    if stats is not None:
+        stats.count += 1
+        stats.time += perf_counter() - stats.started
+
+
+def instrument_engine(engine: Engine):
+    """
+    The instrument_engine function counts the statements executed by the engine and, within a request measured by
+    MetricsMiddleware, their number and duration per request. Pass AsyncEngine.sync_engine for async engines;
+    the request context reaches the event handlers because SQLAlchemy runs them in the caller's context.
+
+    :param engine: Engine: The engine to instrument
+    :return: None
+    """
+    if not event.contains(engine, 'after_cursor_execute', _after_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware that records the latency, status code and SQL statements of every HTTP request
+    by method and route template, and the number of requests in progress. Requests that match no route are
+    recorded as "unmatched" to keep the number of label values bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.routes: dict | None = None
+        # Bound label children are cached, labels() takes a lock and builds the label tuple on every call
+        self.in_progress: dict[str, Gauge] = {}
+        self.children: dict[tuple, tuple] = {}
+        self.counters: dict[tuple, Counter] = {}
+
+    def _route(self, scope: Scope) -> str:
+        if self.routes is None:
+            self.routes = {route.endpoint: route.path for route in scope['app'].routes if hasattr(route, 'endpoint')}
+        return self.routes.get(scope.get('endpoint'), UNMATCHED)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        status_code = 500
+        stats = QueryStats()
+        token = current_queries.set(stats)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress = self.in_progress.get(method)
+        if in_progress is None:
+            in_progress = self.in_progress[method] = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            in_progress.dec()
+            current_queries.reset(token)
+            labels = (method, self._route(scope))
+            children = self.children.get(labels)
+            if children is None:
+                children = self.children[labels] = (REQUEST_DURATION.labels(*labels), REQUEST_QUERIES.labels(*labels),
+                                                    REQUEST_QUERY_TIME.labels(*labels))
+            children[0].observe(elapsed)
+            children[1].observe(stats.count)
+            children[2].observe(stats.time)
+            counter = self.counters.get((labels, status_code))
+            if counter is None:
+                counter = self.counters[(labels, status_code)] = REQUESTS.labels(*labels, str(status_code))
+            counter.inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    The render_metrics function renders all metrics in the Prometheus text format.
+
+    :return: The body and its content type
+    """
+    return generate_latest(registry), CONTENT_TYPE_LATEST
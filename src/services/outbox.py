@@ -0,0 +1,59 @@
+"""
+Outbox worker that delivers the confirmation emails stored by the API. Run one or more processes with
+
+    python -m src.services.outbox
+"""
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.db import DBSession
+from src.repository import outbox as repository_outbox
+from src.services.email import MailWorker, render_emails, confirmation_body, get_mail_config, \
+    CONFIRMATION_SUBJECT
+
+
+async def process_batch(mailer: MailWorker, db: AsyncSession) -> int:
+    """
+    The process_batch function claims a batch of due outbox emails, renders and sends them
+    and records the outcome in the same transaction that holds the row locks.
+
+    :param mailer: MailWorker: Sends the messages over a persistent SMTP connection
+    :param db: AsyncSession: Access the database
+    :return: The number of claimed emails
+    """
+    entries = await repository_outbox.claim_emails(settings.outbox_batch_size, db)
+    if not entries:
+        await db.commit()
+        return 0
+    messages = list(render_emails(((entry.email, confirmation_body(entry.email, entry.username, entry.host))
+                                   for entry in entries), CONFIRMATION_SUBJECT))
+    errors = await mailer.deliver(messages)
+    await repository_outbox.complete_emails(entries, errors, db)
+    return len(entries)
+
+
+async def run():
+    """
+    The run function processes outbox batches until it is stopped, sleeping for
+    settings.outbox_poll_interval seconds whenever the outbox has no full batch left.
+
+    :return: None
+    """
+    mailer = MailWorker(get_mail_config(), idle_timeout=settings.mail_idle_timeout)
+    try:
+        while True:
+            async with DBSession() as db:
+                count = await process_batch(mailer, db)
+            if count < settings.outbox_batch_size:
+                await asyncio.sleep(settings.outbox_poll_interval)
+    finally:
+        await mailer.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,196 @@
+import asyncio
+from dataclasses import dataclass, field
+from time import monotonic, time
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+
+# Sliding window counter: adds a batch of hits to the current fixed window and returns the
+# weighted estimate of hits over the last window, counting all workers.
+SLIDING_WINDOW_SCRIPT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+return math.floor(previous * tonumber(ARGV[3]) + count)
+"""
+
+
+def parse_limit(limit: str) -> Tuple[int, int]:
+    """
+    The parse_limit function parses a limit written as "times/seconds".
+
+    :param limit: str: The limit, for example "3/5"
+    :return: The number of requests and the length of the window in seconds
+    """
+    times, seconds = limit.split('/')
+    return int(times), int(seconds)
+
+
+@dataclass
+class Bucket:
+    times: int
+    seconds: int
+    tokens: float
+    updated: float = field(default_factory=monotonic)
+    pending: int = 0
+
+    def take(self) -> float:
+        now = monotonic()
+        self.tokens = min(self.times, self.tokens + (now - self.updated) * self.times / self.seconds)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.pending += 1
+            return 0
+        return (1 - self.tokens) * self.seconds / self.times
+
+
+class RateLimitEngine:
+    """
+    Rate limiter that decides every request in process with a token bucket per (route, user) and shares the
+    hits with the other workers through Redis in the background. Every sync_interval seconds the hits counted
+    since the last sync are sent in one pipeline of sliding window Lua scripts, and each local bucket is
+    drained to what is left of the global limit. Without Redis, or while Redis fails, buckets stay local
+    (fail-open), so Redis never adds latency to a request.
+    """
+
+    def __init__(self, default_limit: str, limits: Dict[str, str], sync_interval: float):
+        self.default_limit = parse_limit(default_limit)
+        self.limits = {name: parse_limit(limit) for name, limit in limits.items()}
+        self.sync_interval = sync_interval
+        self.redis: Redis | None = None
+        self.buckets: Dict[Tuple[str, int], Bucket] = {}
+        self.task: asyncio.Task | None = None
+        self.sync_errors = 0
+
+    def init(self, redis: Redis):
+        """
+        The init function connects the limiter to Redis. Until it is called the limits are enforced per process.
+
+        :param self: Represent the instance of the class
+        :param redis: Redis: The client created at application startup
+        :return: None
+        """
+        self.redis = redis
+
+    async def start(self):
+        """
+        The start function starts the background Redis synchronisation.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self.redis is not None and self.task is None:
+            self.script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+            self.task = asyncio.create_task(self._sync_forever())
+
+    async def stop(self):
+        """
+        The stop function stops the background synchronisation after sending the remaining hits.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+            await self.sync()
+
+    def hit(self, name: str, user_id: int) -> float:
+        """
+        The hit function counts a request of the user to the route.
+
+        :param self: Represent the instance of the class
+        :param name: str: The name of the route
+        :param user_id: int: The id of the user
+        :return: 0 if the request is allowed, otherwise the number of seconds to wait
+        """
+        key = (name, user_id)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            times, seconds = self.limits.get(name, self.default_limit)
+            bucket = self.buckets[key] = Bucket(times, seconds, times)
+        return bucket.take()
+
+    def describe(self, name: str) -> str:
+        """
+        The describe function returns the limit of the route in words for the OpenAPI description.
+
+        :param self: Represent the instance of the class
+        :param name: str: The name of the route
+        :return: The description of the limit
+        """
+        times, seconds = self.limits.get(name, self.default_limit)
+        return f"No more than {times} request{'s' if times != 1 else ''} per " \
+               f"{seconds} second{'s' if seconds != 1 else ''}"
+
+    async def sync(self):
+        """
+        The sync function sends the pending hits of all buckets to Redis and applies the global counts.
+        Idle full buckets are dropped to keep memory bounded.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        now = monotonic()
+        for key in [key for key, bucket in self.buckets.items()
+                    if not bucket.pending and now - bucket.updated > bucket.seconds]:
+            del self.buckets[key]
+        dirty = [(key, bucket) for key, bucket in self.buckets.items() if bucket.pending]
+        if not dirty or self.redis is None:
+            return
+        timestamp = time()
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for (name, user_id), bucket in dirty:
+                    window = int(timestamp // bucket.seconds)
+                    weight = 1 - (timestamp % bucket.seconds) / bucket.seconds
+                    prefix = f'rate_limit:{name}:{user_id}'
+                    await self.script(keys=[f'{prefix}:{window}', f'{prefix}:{window - 1}'],
+                                      args=[bucket.pending, bucket.seconds * 2000, weight], client=pipe)
+                counts = await pipe.execute()
+        except RedisError:
+            self.sync_errors += 1
+            return
+        for (_, bucket), count in zip(dirty, counts):
+            bucket.pending = 0
+            bucket.tokens = min(bucket.tokens, max(0, bucket.times - int(count)))
+
+    async def _sync_forever(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters of the limiter.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"buckets": len(self.buckets), "sync_errors": self.sync_errors}
+
+
+rate_limiter = RateLimitEngine(settings.rate_limit_default, settings.rate_limits, settings.rate_limit_sync_interval)
+
+
+async def rate_limit(request: Request, current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The rate_limit function is a dependency that limits the requests of the current user to the matched route.
+    The limit is looked up in settings.rate_limits by the name of the endpoint function.
+
+    :param request: Request: Get the matched endpoint
+    :param current_user: User: Get the current user
+    :return: None
+    """
+    retry_after = rate_limiter.hit(request.scope['endpoint'].__name__, current_user.id)
+    if retry_after:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                            headers={"Retry-After": str(int(retry_after) + 1)})
@@ -0,0 +1,126 @@
+from secrets import token_hex
+from time import time
+
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+# Replaces the current token id of a family with the next one. Any other id is a refresh token that was
+# already used, so the family is revoked.
+ROTATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+  return 1
+end
+if current then
+  redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RefreshTokens:
+    """
+    Refresh token sessions kept in Redis instead of the users table. Every login starts a rotation family whose
+    key holds the id (jti) of the only refresh token of the family that may be used, and expires together with
+    that token. A refresh swaps the id atomically; presenting an older token of the family means it was copied,
+    so the whole family is revoked and its holder has to log in again. Families are independent, so a user can be
+    signed in on several devices. Without Redis the families are kept in process.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.redis: Redis | None = None
+        self.script = None
+        self._local: dict[str, tuple[str, float]] = {}
+        self.issued = 0
+        self.rotated = 0
+        self.rejected = 0
+
+    def init(self, redis: Redis):
+        """
+        The init function connects the store to Redis so that all workers share the families.
+
+        :param self: Represent the instance of the class
+        :param redis: Redis: The client created at application startup
+        :return: None
+        """
+        self.redis = redis
+        self.script = redis.register_script(ROTATE_SCRIPT)
+
+    @staticmethod
+    def _key(family: str) -> str:
+        return f'refresh_family:{family}'
+
+    @staticmethod
+    def _unavailable() -> HTTPException:
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                             detail="Sessions are unavailable, try again later", headers={"Retry-After": "1"})
+
+    async def _create(self, email: str, family: str, token_id: str) -> str:
+        return await auth_service.create_refresh_token(data={"sub": email, "fam": family, "jti": token_id},
+                                                       expires_delta=self.ttl)
+
+    async def issue(self, email: str) -> str:
+        """
+        The issue function starts a new rotation family for a login and returns its first refresh token.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user who logged in
+        :return: The encoded refresh token
+        """
+        family, token_id = token_hex(16), token_hex(16)
+        if self.redis is None:
+            self._local[family] = (token_id, time() + self.ttl)
+        else:
+            try:
+                await self.redis.set(self._key(family), token_id, ex=self.ttl)
+            except RedisError:
+                raise self._unavailable()
+        self.issued += 1
+        return await self._create(email, family, token_id)
+
+    async def rotate(self, payload: dict) -> str:
+        """
+        The rotate function exchanges a decoded refresh token for the next token of its family. A token that is
+        not the current one of its family revokes the family; it was reused, the family expired or was revoked,
+        or it was issued before tokens were grouped into families.
+
+        :param self: Represent the instance of the class
+        :param payload: dict: The verified claims of the presented refresh token
+        :return: The encoded next refresh token
+        """
+        family, token_id, next_id = payload.get('fam'), payload.get('jti'), token_hex(16)
+        if family is None or token_id is None:
+            rotated = False
+        elif self.redis is None:
+            current, expires = self._local.pop(family, (None, 0.0))
+            rotated = current == token_id and expires > time()
+            if rotated:
+                self._local[family] = (next_id, time() + self.ttl)
+        else:
+            try:
+                rotated = bool(await self.script(keys=[self._key(family)], args=[token_id, next_id, self.ttl]))
+            except RedisError:
+                raise self._unavailable()
+        if not rotated:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        self.rotated += 1
+        return await self._create(payload['sub'], family, next_id)
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters of issued, rotated and rejected refresh tokens.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"issued": self.issued, "rotated": self.rotated, "rejected": self.rejected}
+
+
+refresh_tokens = RefreshTokens(settings.refresh_token_ttl)
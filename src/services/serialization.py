@@ -0,0 +1,19 @@
+from operator import attrgetter
+from typing import Iterable, Type
+
+from pydantic import BaseModel
+
+
+def dump_rows(model: Type[BaseModel], items: Iterable) -> list[dict]:
+    """
+    The dump_rows function copies the fields of the response model from ORM objects into plain dictionaries.
+    Rows read from the database were validated when they were written, so they are not validated again;
+    the dictionaries are meant for ORJSONResponse, which encodes datetimes natively.
+
+    :param model: Type[BaseModel]: The response model that lists the fields
+    :param items: Iterable: The ORM objects
+    :return: A list of dictionaries with the fields of the model
+    """
+    fields = tuple(model.__fields__)
+    getter = attrgetter(*fields)
+    return [dict(zip(fields, getter(item))) for item in items]
@@ -0,0 +1,97 @@
+from abc import ABC, abstractmethod
+from hashlib import sha256
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+
+
+class AvatarStorage(ABC):
+    """
+    Place where processed avatars are kept. Implementations must not block the event loop.
+    """
+
+    @abstractmethod
+    async def save(self, name: str, data: bytes) -> str:
+        """
+        The save function stores the image under the given name, replacing an older one.
+
+        :param self: Represent the instance of the class
+        :param name: str: A name unique for the user, derived from the user id
+        :param data: bytes: The encoded image
+        :return: The public url of the stored image
+        """
+
+    async def delete(self, url: str):
+        """
+        The delete function removes an image that is no longer used. Urls the storage did not create are ignored.
+        Storages that overwrite the image of a name in place keep nothing to delete.
+
+        :param self: Represent the instance of the class
+        :param url: str: The public url returned by save
+        :return: None
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+
+    def __init__(self, cloud_name: str, api_key: int, api_secret: str, folder: str = 'ContactsApp'):
+        self.credentials = dict(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.folder = folder
+        self._upload = None
+
+    def _uploader(self):
+        # the cloudinary SDK is imported and configured on the first upload, not when the app is imported
+        if self._upload is None:
+            import cloudinary
+            import cloudinary.uploader
+            cloudinary.config(**self.credentials)
+            self._upload = cloudinary.uploader.upload
+        return self._upload
+
+    async def save(self, name: str, data: bytes) -> str:
+        r = await run_in_threadpool(self._uploader(), data, public_id=f'{self.folder}/{name}', overwrite=True)
+        return r['secure_url']
+
+
+class LocalStorage(AvatarStorage):
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = Path(directory)
+        self.base_url = base_url.rstrip('/')
+
+    def _write(self, path: Path, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    async def save(self, name: str, data: bytes) -> str:
+        # the content hash changes the url on every new avatar, so browsers never show a cached old one
+        filename = f'{name}-{sha256(data).hexdigest()[:12]}.png'
+        path = self.directory / filename
+        if path.resolve().parent != self.directory.resolve():
+            raise ValueError(f'Avatar name {name!r} leaves the avatar directory')
+        await run_in_threadpool(self._write, path, data)
+        return f'{self.base_url}/{filename}'
+
+    async def delete(self, url: str):
+        prefix = f'{self.base_url}/'
+        filename = url[len(prefix):] if url.startswith(prefix) else ''
+        if filename and '/' not in filename and filename not in ('.', '..'):
+            await run_in_threadpool((self.directory / filename).unlink, missing_ok=True)
+
+
+def get_storage() -> AvatarStorage:
+    """
+    The get_storage function creates the avatar storage selected by settings.avatar_storage.
+
+    :return: The storage backend
+    """
+    if settings.avatar_storage == 'local':
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_base_url)
+    return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret)
+
+
+avatar_storage = get_storage()
@@ -1,20 +1,32 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, pool
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from main import app
 from src.database.models import Base
 from src.database.db import get_db
+from src.services.cache import user_cache
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs every request on its own event loop, so connections must not be pooled between requests
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=pool.NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False,
+                                              class_=AsyncSession)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -34,11 +46,12 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
+    async def override_get_db():
+        db = TestingAsyncSessionLocal()
         try:
-            yield session
+            yield db
         finally:
-            session.close()
+            await db.close()
 
     app.dependency_overrides[get_db] = override_get_db
 
@@ -48,3 +61,67 @@ def client(session):
 @pytest.fixture(scope="module")
 def user():
     return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
+
+
+# The most SQL statements every API route may run, with the user looked up in the database (user cache empty)
+QUERY_BUDGETS = {
+    "POST /api/auth/signup": 4,
+    "POST /api/auth/login": 1,
+    "POST /api/auth/request_email": 2,
+    "GET /api/auth/refresh_token": 0,
+    "GET /api/auth/confirmed_email/{token}": 3,
+    "GET /api/contacts/": 2,
+    "GET /api/contacts/export": 2,
+    "GET /api/contacts/{contact_id}": 2,
+    "GET /api/contacts/search/{information}": 2,
+    "GET /api/contacts/get/7-birthdays": 2,
+    "POST /api/contacts/": 2,
+    "POST /api/contacts/bulk": 2,
+    "PUT /api/contacts/{contact_id}": 2,
+    "PATCH /api/contacts/{contact_id}": 2,
+    "DELETE /api/contacts/{contact_id}": 2,
+    "GET /api/users/me/": 1,
+    "PATCH /api/users/avatar": 3,
+}
+# A statement shape seen this many times within one call is reported as an N+1 query
+REPEAT_LIMIT = 3
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalizes a statement so that statements differing only in literal values or IN list sizes compare equal.
+    """
+    statement = re.sub(r"'[^']*'|\b\d+\b", '?', statement)
+    statement = re.sub(r'\((?:\s*[?$%:][\w():]*\s*,)+\s*[?$%:][\w():]*\s*\)', '(?)', statement)
+    return ' '.join(statement.split())
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Returns a context manager that records the SQL statements run through the application engine and fails the test
+    if the route runs more statements than its budget in QUERY_BUDGETS or repeats a statement shape REPEAT_LIMIT
+    times. The user cache is emptied first, so the budget covers the user lookup.
+    """
+
+    @contextmanager
+    def check(route: str, budget: int | None = None, repeat_limit: int = REPEAT_LIMIT):
+        budget = QUERY_BUDGETS[route] if budget is None else budget
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        user_cache._local.clear()
+        event.listen(async_engine.sync_engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(async_engine.sync_engine, 'before_cursor_execute', record)
+        listing = '\n'.join(statements)
+        assert len(statements) <= budget, f'{route} ran {len(statements)} statements, budget {budget}:\n{listing}'
+        if statements:
+            shape, count = Counter(map(statement_shape, statements)).most_common(1)[0]
+            assert count < repeat_limit, f'{route} repeated a statement {count} times (N+1?):\n{shape}'
+
+    return check
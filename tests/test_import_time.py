@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+# Cumulative import time of main in milliseconds, the best of RUNS cold interpreters
+IMPORT_TIME_BUDGET = int(os.environ.get('IMPORT_TIME_BUDGET', 1200))
+RUNS = 3
+# Subsystems loaded by the first request that needs them, never by importing the app
+LAZY_MODULES = ('fastapi_mail', 'httpx', 'jinja2', 'cloudinary', 'passlib', 'jose.jwt', 'PIL.Image')
+
+
+def import_profile() -> dict[str, int]:
+    """
+    Imports main in a fresh interpreter with -X importtime and returns the cumulative time of every module
+    in microseconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, module = line.split('|')
+            profile[module.strip()] = int(cumulative)
+    return profile
+
+
+def test_heavy_subsystems_are_lazy():
+    profile = import_profile()
+    assert 'main' in profile
+    assert [module for module in LAZY_MODULES if module in profile] == []
+
+
+def test_import_time_budget():
+    best = min(import_profile()['main'] for _ in range(RUNS)) / 1000
+    assert best <= IMPORT_TIME_BUDGET, f'importing main took {best:.0f} ms, budget {IMPORT_TIME_BUDGET} ms'
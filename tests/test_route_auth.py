@@ -1,11 +1,7 @@
-from unittest.mock import MagicMock
+from src.database.models import User, EmailOutbox
 
-from src.database.models import User
 
-
-def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_create_user(client, session, user):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -14,6 +10,9 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    outbox = session.query(EmailOutbox).filter(EmailOutbox.email == user.get('email')).all()
+    assert len(outbox) == 1
+    assert outbox[0].sent_at is None
 
 
 def test_repeat_create_user(client, user):
@@ -26,6 +25,16 @@ def test_repeat_create_user(client, user):
     assert data["detail"] == "Account already exists"
 
 
+def test_request_email(client, session, user):
+    response = client.post(
+        "/api/auth/request_email",
+        json={"email": user.get('email')},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["message"] == "Check your email for confirmation."
+    assert session.query(EmailOutbox).filter(EmailOutbox.email == user.get('email')).count() == 2
+
+
 def test_login_user_not_confirmed(client, user):
     response = client.post(
         "/api/auth/login",
@@ -67,3 +76,35 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+def test_login_busy(client, user, monkeypatch):
+    monkeypatch.setattr("src.services.auth.settings.password_hash_max_pending", 0)
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 503, response.text
+    assert response.headers["Retry-After"] == "1"
+
+
+def refresh(client, token: str):
+    return client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_refresh_token_rotation(client, user):
+    devices = [client.post("/api/auth/login", data={"username": user.get('email'), "password": user.get('password')})
+               .json()["refresh_token"] for _ in range(2)]
+
+    response = refresh(client, devices[0])
+    assert response.status_code == 200, response.text
+    rotated = response.json()["refresh_token"]
+    assert rotated != devices[0]
+
+    response = refresh(client, devices[0])
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+    # the reuse revoked the whole family, including its newest token
+    assert refresh(client, rotated).status_code == 401
+    # the other device keeps its session
+    assert refresh(client, devices[1]).status_code == 200
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+from fastapi.routing import APIRoute
+
+from main import app
+from src.database.models import User, Contact
+from src.schemas import ContactResponse
+from src.services.rate_limit import rate_limiter
+
+CONTACT = {"firstname": "Wade", "lastname": "Wilson", "email": "wade@example.com", "phone": "+380501234567",
+           "birthday": "1991-02-01T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def token(client, session, user):
+    default_limit, rate_limiter.default_limit = rate_limiter.default_limit, (1000, 1)
+    client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post("/api/auth/login", data={"username": user.get('email'), "password": user.get('password')})
+    yield response.json()["access_token"]
+    rate_limiter.default_limit = default_limit
+    rate_limiter.buckets.clear()
+
+
+def test_descriptions_match_rate_limits():
+    routes = [route for route in app.routes if isinstance(route, APIRoute) and route.path.startswith('/api/contacts')]
+    assert routes
+    for route in routes:
+        assert route.description == rate_limiter.describe(route.endpoint.__name__), route.path
+
+
+def test_create_contact(client, token):
+    response = client.post("/api/contacts/", json=CONTACT, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201, response.text
+    assert response.json()["phone"] == CONTACT["phone"]
+
+
+@pytest.mark.parametrize("path", ["/api/contacts/", "/api/contacts/1", "/api/contacts/get/7-birthdays"])
+def test_not_modified(client, token, path):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = client.get(path, headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code == 304, response.text
+    assert response.headers["ETag"] == etag
+    assert response.content == b''
+
+
+@pytest.mark.parametrize("path, other", [("/api/contacts/", "/api/contacts/?limit=1"),
+                                         ("/api/contacts/", "/api/contacts/?skip=1"),
+                                         ("/api/contacts/1", "/api/contacts/2"),
+                                         ("/api/contacts/get/7-birthdays", "/api/contacts/get/7-birthdays?days=30")])
+def test_etag_per_representation(client, token, path, other):
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get(path, headers=headers).headers["ETag"]
+    response = client.get(other, headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code != 304, response.text
+    assert response.headers.get("ETag") != etag
+
+
+def test_missing_contact_not_modified(client, token):
+    headers = {"Authorization": f"Bearer {token}", "If-None-Match": "*"}
+    response = client.get("/api/contacts/2", headers=headers)
+    assert response.status_code == 404, response.text
+
+
+def test_list_matches_response_model(client, token):
+    response = client.get("/api/contacts/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/json"
+    for row in response.json():
+        assert json.loads(ContactResponse(**row).json()) == row
+    schema = client.get("/openapi.json").json()["paths"]["/api/contacts/"]["get"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"]["items"] == {"$ref": "#/components/schemas/ContactResponse"}
+
+
+def test_write_changes_etag(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/api/contacts/", headers=headers).headers["ETag"]
+    response = client.put("/api/contacts/1", json=dict(CONTACT, firstname="Deadpool"), headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/contacts/", headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["firstname"] == "Deadpool"
+
+
+def test_patch_contact(client, token, session):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.patch("/api/contacts/1", json={"lastname": "Pool", "birthday": "1991-03-04T00:00:00"},
+                            headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["firstname"], data["lastname"]) == ("Deadpool", "Pool")
+    assert session.query(Contact.birthday_md).filter(Contact.id == 1).scalar() == 304
+
+
+def test_patch_contact_not_found(client, token):
+    response = client.patch("/api/contacts/2", json={"lastname": "Pool"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404, response.text
+
+
+def test_rate_limit(client, token, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "limits", {"remove_contact": (1, 60)})
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.delete("/api/contacts/1", headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.delete("/api/contacts/1", headers=headers)
+    assert response.status_code == 429, response.text
+    assert "Retry-After" in response.headers
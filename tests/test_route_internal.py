@@ -0,0 +1,39 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from main import app
+from src.routes import internal
+
+
+@pytest.fixture
+def internal_client(monkeypatch):
+    monkeypatch.setattr("src.routes.internal.settings.internal_token", "operator-token")
+    internal_app = FastAPI()
+    internal_app.include_router(internal.router)
+    return TestClient(internal_app)
+
+
+def test_disabled_by_default():
+    assert not [route for route in app.routes if getattr(route, 'path', '').startswith('/internal')]
+
+
+def test_stats_require_token(internal_client):
+    assert internal_client.get("/internal/stats").status_code == 403
+    response = internal_client.get("/internal/stats", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 403
+    response = internal_client.get("/internal/stats", headers={"Authorization": "Bearer operator-token"})
+    assert response.status_code == 200, response.text
+    assert "db_pool" in response.json()
+
+
+def test_refused_without_configured_token(internal_client, monkeypatch):
+    monkeypatch.setattr("src.routes.internal.settings.internal_token", "")
+    assert internal_client.get("/internal/stats", headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_metrics_require_token(internal_client):
+    assert internal_client.get("/internal/metrics").status_code == 403
+    response = internal_client.get("/internal/metrics", headers={"Authorization": "Bearer operator-token"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
@@ -0,0 +1,118 @@
+import asyncio
+import io
+
+import pytest
+from fastapi.routing import APIRoute
+from PIL import Image
+from sqlalchemy import text
+
+from conftest import QUERY_BUDGETS, async_engine
+from main import app
+from src.services.auth import auth_service
+from src.services.rate_limit import rate_limiter
+from src.services.storage import LocalStorage
+
+CONTACT = {"firstname": "Wade", "lastname": "Wilson", "email": "wade@example.com", "phone": "+380501234567",
+           "birthday": "1991-02-01T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def tokens():
+    default_limit, rate_limiter.default_limit = rate_limiter.default_limit, (1000, 1)
+    yield {}
+    rate_limiter.default_limit = default_limit
+    rate_limiter.buckets.clear()
+
+
+def auth(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_every_route_has_budget():
+    routes = {f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute)
+              and route.path.startswith('/api/') for method in route.methods}
+    assert routes == set(QUERY_BUDGETS)
+
+
+def test_auth_routes(client, user, tokens, query_budget):
+    with query_budget("POST /api/auth/signup"):
+        assert client.post("/api/auth/signup", json=user).status_code == 201
+    with query_budget("POST /api/auth/request_email"):
+        assert client.post("/api/auth/request_email", json={"email": user["email"]}).status_code == 200
+    email_token = auth_service.create_email_token({"sub": user["email"]})
+    with query_budget("GET /api/auth/confirmed_email/{token}"):
+        assert client.get(f"/api/auth/confirmed_email/{email_token}").status_code == 200
+    with query_budget("POST /api/auth/login"):
+        response = client.post("/api/auth/login", data={"username": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    with query_budget("GET /api/auth/refresh_token"):
+        response = client.get("/api/auth/refresh_token",
+                              headers={"Authorization": f"Bearer {response.json()['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    tokens.update(response.json())
+
+
+def test_users_routes(client, tokens, query_budget, monkeypatch, tmp_path):
+    monkeypatch.setattr("src.routes.users.avatar_storage", LocalStorage(str(tmp_path), '/static/avatars'))
+    with query_budget("GET /api/users/me/"):
+        assert client.get("/api/users/me/", headers=auth(tokens)).status_code == 200
+    for color in ('red', 'blue'):
+        image = io.BytesIO()
+        Image.new('RGB', (300, 200), color).save(image, 'PNG')
+        with query_budget("PATCH /api/users/avatar"):
+            response = client.patch("/api/users/avatar", headers=auth(tokens),
+                                    files={"file": ("avatar.png", image.getvalue(), "image/png")})
+        assert response.status_code == 200, response.text
+    # the first avatar was deleted once the second one was saved
+    assert [path.name for path in tmp_path.iterdir()] == [response.json()["avatar"].rsplit('/', 1)[1]]
+
+
+def test_contacts_routes(client, tokens, query_budget):
+    headers = auth(tokens)
+    with query_budget("POST /api/contacts/"):
+        assert client.post("/api/contacts/", json=CONTACT, headers=headers).status_code == 201
+    rows = "\n".join(f'{{"firstname": "Wade", "lastname": "Wilson", "email": "wade{i}@example.com", '
+                     f'"phone": "+38050123{i:04}", "birthday": "1991-02-01T00:00:00"}}' for i in range(20))
+    with query_budget("POST /api/contacts/bulk"):
+        response = client.post("/api/contacts/bulk", content=rows,
+                               headers=dict(headers, **{"Content-Type": "application/x-ndjson"}))
+    assert response.json()["inserted"] == 20, response.text
+    for route, path in (("GET /api/contacts/", "/api/contacts/?limit=100"),
+                        ("GET /api/contacts/export", "/api/contacts/export?format=csv"),
+                        ("GET /api/contacts/{contact_id}", "/api/contacts/1"),
+                        ("GET /api/contacts/search/{information}", "/api/contacts/search/wil"),
+                        ("GET /api/contacts/get/7-birthdays", "/api/contacts/get/7-birthdays?days=365")):
+        with query_budget(route):
+            assert client.get(path, headers=headers).status_code == 200
+    etag = client.get("/api/contacts/1", headers=headers).headers["ETag"]
+    # a matching ETag answers 304 after the user lookup, without loading the contact
+    with query_budget("GET /api/contacts/{contact_id}", budget=1):
+        assert client.get("/api/contacts/1", headers=dict(headers, **{"If-None-Match": etag})).status_code == 304
+    with query_budget("PUT /api/contacts/{contact_id}"):
+        assert client.put("/api/contacts/1", json=CONTACT, headers=headers).status_code == 200
+    with query_budget("PATCH /api/contacts/{contact_id}"):
+        assert client.patch("/api/contacts/1", json={"lastname": "Pool"}, headers=headers).status_code == 200
+    with query_budget("DELETE /api/contacts/{contact_id}"):
+        assert client.delete("/api/contacts/1", headers=headers).status_code == 200
+
+
+def test_budget_exceeded(client, query_budget):
+    with pytest.raises(AssertionError, match='ran 2 statements, budget 1'):
+        with query_budget("GET /api/users/me/"):
+            run_statements("SELECT 1", "SELECT 2")
+
+
+def test_repeated_statement(client, query_budget):
+    with pytest.raises(AssertionError, match=r'repeated a statement 3 times \(N\+1\?\)'):
+        with query_budget("GET /api/users/me/", budget=10):
+            run_statements("SELECT email FROM users WHERE id = 1", "SELECT email FROM users WHERE id = 2",
+                           "SELECT email FROM users WHERE id = 3")
+
+
+def run_statements(*statements: str):
+    async def run():
+        async with async_engine.connect() as connection:
+            for statement in statements:
+                await connection.execute(text(statement))
+
+    asyncio.run(run())
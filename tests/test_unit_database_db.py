@@ -0,0 +1,31 @@
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.db import InstrumentedQueuePool, get_pool_stats
+
+
+class TestPoolStats(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=InstrumentedQueuePool,
+                                          pool_size=1, max_overflow=0)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_checkout_counted(self):
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            stats = get_pool_stats(self.engine)
+            self.assertEqual(stats["checked_out"], 1)
+        stats = get_pool_stats(self.engine)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+        self.assertGreaterEqual(stats["max_wait_ms"], stats["avg_wait_ms"])
+
+
+if __name__ == '__main__':
+    unittest.main()
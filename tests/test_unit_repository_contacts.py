@@ -1,48 +1,74 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
-from src.schemas import ContactModel
+from src.schemas import ContactModel, ContactPatchModel
 from src.repository.contacts import (
     get_contact_by_id,
     get_contacts,
+    encode_cursor,
+    decode_cursor,
     get_contacts_7days_birthdays,
+    birthday_window,
     get_contacts_by_info,
     create_contact,
+    create_contacts,
     remove_contact,
     update_contact,
+    patch_contact,
 )
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user = User(id=1)
 
+    def mock_result(self, method, value):
+        result = MagicMock()
+        getattr(result.scalars.return_value, method).return_value = value
+        self.session.execute.return_value = result
+
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.mock_result('all', contacts)
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_after_cursor(self):
+        contacts = [Contact(id=11), Contact(id=12)]
+        self.mock_result('all', contacts)
+        result = await get_contacts(skip=0, limit=2, user=self.user, db=self.session, cursor=10)
+        self.assertEqual(result, contacts)
+        stmt = str(self.session.execute.call_args.args[0])
+        self.assertIn('contacts.id >', stmt)
+        self.assertNotIn('OFFSET', stmt)
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(12345)), 12345)
+
+    def test_decode_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor!')
+
     async def test_get_contact_found_id(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.mock_result('first', contact)
         result_id = await get_contact_by_id(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result_id, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.mock_result('first', None)
         result = await get_contact_by_id(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_get_contacts_found_information(self):
         contacts = [Contact(firstname='Test', lastname='Tests', email='test@test.com')]
-        self.session.query().filter().filter().all.return_value = contacts
+        self.mock_result('all', contacts)
 
         result_info_firstname = await get_contacts_by_info(information='Test', user=self.user, db=self.session)
         self.assertEqual(result_info_firstname, contacts)
@@ -53,8 +79,15 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result_info_email = await get_contacts_by_info(information='test@test.com', user=self.user, db=self.session)
         self.assertEqual(result_info_email, contacts)
 
+    async def test_get_contacts_by_info_paginated(self):
+        self.mock_result('all', [])
+        await get_contacts_by_info(information='te%', user=self.user, db=self.session, skip=5, limit=10)
+        stmt = str(self.session.execute.call_args.args[0].compile(compile_kwargs={'literal_binds': True}))
+        self.assertIn('LIMIT 10 OFFSET 5', stmt)
+        self.assertIn("'%te\\%%'", stmt)
+
     async def test_get_contacts_information_not_found(self):
-        self.session.query().filter().filter().all.return_value = None
+        self.mock_result('all', None)
 
         result_info_firstname = await get_contacts_by_info(information='Test', user=self.user, db=self.session)
         self.assertIsNone(result_info_firstname)
@@ -67,14 +100,24 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contacts_7days_birthdays_found(self):
         contacts = [Contact(birthday=datetime.now()+timedelta(days=1))]
-        self.session.query().filter().all.return_value = contacts
+        self.mock_result('all', contacts)
         result = await get_contacts_7days_birthdays(user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
     async def test_get_contacts_7days_birthdays_not_found(self):
-        self.session.query().filter().all.return_value = None
+        self.mock_result('all', [])
         result = await get_contacts_7days_birthdays(user=self.user, db=self.session)
-        self.assertIsNone(result)
+        self.assertEqual(result, [])
+
+    def test_birthday_window(self):
+        self.assertEqual(birthday_window(date(2026, 3, 10), 7), (311, 317))
+
+    def test_birthday_window_new_year(self):
+        self.assertEqual(birthday_window(date(2026, 12, 28), 7), (1229, 104))
+
+    def test_birthday_window_leap_day(self):
+        start_md, end_md = birthday_window(date(2027, 2, 25), 7)
+        self.assertTrue(start_md <= Contact(birthday=datetime(2000, 2, 29)).birthday_md <= end_md)
 
     async def test_create_contact(self):
         body = ContactModel(
@@ -85,24 +128,49 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             birthday=datetime.now()-timedelta(weeks=250),
             user_id=self.user.id
         )
+        contact = Contact(id=1, **body.dict())
+        self.mock_result('one', contact)
         result = await create_contact(body=body, user=self.user, db=self.session)
-        self.assertEqual(result.firstname, body.firstname)
-        self.assertEqual(result.lastname, body.lastname)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone, body.phone)
-        self.assertEqual(result.birthday, body.birthday)
-        self.assertTrue(hasattr(result, "id"))
+        self.assertEqual(result, contact)
+        params = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(params['user_id'], self.user.id)
+        self.assertEqual(params['birthday_md'], body.birthday.month * 100 + body.birthday.day)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_not_called()
+
+    async def test_create_contacts(self):
+        body = ContactModel(
+            firstname='Test',
+            lastname='Tests',
+            email='test@test.com',
+            phone='0998887766',
+            birthday=datetime(1990, 2, 3),
+        )
+        self.mock_result('all', [body.phone])
+        result = await create_contacts(bodies=[body], user=self.user, db=self.session)
+        self.assertEqual(result, [body.phone])
+        rows = self.session.execute.call_args.args[1]
+        self.assertEqual(rows[0]['birthday_md'], 203)
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+
+    async def test_create_contacts_empty(self):
+        result = await create_contacts(bodies=[], user=self.user, db=self.session)
+        self.assertEqual(result, [])
+        self.session.execute.assert_not_called()
 
     async def test_remove_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.mock_result('first', contact)
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.mock_result('first', None)
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
+        self.session.commit.assert_not_called()
 
     async def test_update_contact_found(self):
         body = ContactModel(
@@ -114,10 +182,12 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             user_id=self.user.id
         )
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
-        self.session.commit.return_value = None
+        self.mock_result('first', contact)
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        params = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(params['birthday_md'], body.birthday.month * 100 + body.birthday.day)
 
     async def test_update_contact_not_found(self):
         body = ContactModel(
@@ -128,11 +198,29 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             birthday=datetime.now() - timedelta(weeks=250),
             user_id=self.user.id
         )
-        self.session.query().filter().first.return_value = None
-        self.session.commit.return_value = None
+        self.mock_result('first', None)
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
 
 
+    async def test_patch_contact(self):
+        contact = Contact()
+        self.mock_result('first', contact)
+        result = await patch_contact(contact_id=1, body=ContactPatchModel(birthday=datetime(1990, 2, 3), email=None),
+                                     user=self.user, db=self.session)
+        self.assertEqual(result, contact)
+        params = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(params['birthday_md'], 203)
+        self.assertNotIn('email', params)
+        self.assertNotIn('firstname', params)
+
+    async def test_patch_contact_empty(self):
+        contact = Contact()
+        self.mock_result('first', contact)
+        result = await patch_contact(contact_id=1, body=ContactPatchModel(), user=self.user, db=self.session)
+        self.assertEqual(result, contact)
+        self.session.commit.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox
+from src.repository.outbox import (
+    add_confirmation_email,
+    create_confirmation_email,
+    claim_emails,
+    complete_emails,
+)
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+
+    def test_add_confirmation_email(self):
+        result = add_confirmation_email('test@test.com', 'deadpool', 'http://localhost/', self.session)
+        self.assertEqual(result.email, 'test@test.com')
+        self.session.add.assert_called_once_with(result)
+        self.session.commit.assert_not_called()
+
+    async def test_create_confirmation_email(self):
+        result = await create_confirmation_email('test@test.com', 'deadpool', 'http://localhost/', self.session)
+        self.assertEqual(result.host, 'http://localhost/')
+        self.session.commit.assert_awaited_once()
+
+    async def test_claim_emails(self):
+        entries = [EmailOutbox(id=1), EmailOutbox(id=2)]
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = entries
+        self.session.execute.return_value = result
+        self.assertEqual(await claim_emails(limit=2, db=self.session), entries)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn('FOR UPDATE SKIP LOCKED', str(stmt.compile(dialect=postgresql.dialect())))
+
+    async def test_complete_emails(self):
+        sent = EmailOutbox(id=1, attempts=0)
+        failed = EmailOutbox(id=2, attempts=0)
+        await complete_emails([sent, failed], [None, 'Connection refused'], self.session)
+        self.assertIsNotNone(sent.sent_at)
+        self.assertIsNone(failed.sent_at)
+        self.assertEqual(failed.attempts, 1)
+        self.assertEqual(failed.last_error, 'Connection refused')
+        self.assertGreater(failed.available_at, datetime.now())
+        self.session.commit.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
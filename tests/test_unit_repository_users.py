@@ -1,14 +1,13 @@
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel
 from src.repository.users import (
     get_user_by_email,
     create_user,
-    update_token,
     update_avatar,
     confirmed_email
 )
@@ -17,19 +16,24 @@ from src.repository.users import (
 class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user = User(id=1, refresh_token='qwerty123', email='test@test.com', confirmed=False)
 
+    def mock_result(self, value):
+        result = MagicMock()
+        result.scalars.return_value.first.return_value = value
+        self.session.execute.return_value = result
+
     def tearDown(self) -> None:
         self.user = User(id=1, refresh_token='qwerty123', email='test@test.com', confirmed=False)
 
     async def test_get_user_by_email(self):
-        self.session.query().filter().first.return_value = self.user
+        self.mock_result(self.user)
         result = await get_user_by_email(email='test@test.com', db=self.session)
         self.assertEqual(result, self.user)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.mock_result(None)
         result = await get_user_by_email(email='test@test.com', db=self.session)
         self.assertIsNone(result)
 
@@ -44,21 +48,14 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.email, body.email)
         self.assertEqual(result.password, body.password)
 
-    async def test_update_token(self):
-        token = 'test_token123'
-        await update_token(user=self.user, token=token, db=self.session)
-        self.assertEqual(self.user.refresh_token, token)
-
     async def test_confirmed_email(self):
-        self.session.query().filter().first.return_value = self.user
+        self.mock_result(self.user)
         await confirmed_email(email='test@test.com', db=self.session)
-        self.session.commit.return_value = None
         self.assertEqual(self.user.confirmed, True)
 
     async def test_update_avatar(self):
-        self.session.query().filter().first.return_value = self.user
+        self.mock_result(self.user)
         await update_avatar(email='test@test.com', url='test_avatar', db=self.session)
-        self.session.commit.return_value = None
         self.assertEqual(self.user.avatar, 'test_avatar')
 
 
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from fastapi import HTTPException
+from jose import jwt
+
+from src.database.models import User
+from src.services.auth import Auth
+from src.services.cache import TokenCache, UserCache
+
+
+class TestAuthPasswords(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.auth.get_password_hash('123456789')
+        self.assertTrue(await self.auth.verify_password('123456789', hashed))
+        self.assertFalse(await self.auth.verify_password('password', hashed))
+        self.assertEqual(Auth.hash_pending, 0)
+
+    async def test_pool_saturated(self):
+        with patch('src.services.auth.settings.password_hash_max_pending', 0):
+            with self.assertRaises(HTTPException) as err:
+                await self.auth.get_password_hash('123456789')
+        self.assertEqual(err.exception.status_code, 503)
+
+    async def test_queue_timeout(self):
+        with patch('src.services.auth.settings.password_hash_queue_timeout', -1):
+            with self.assertRaises(HTTPException) as err:
+                await self.auth.verify_password('123456789', 'hash')
+        self.assertEqual(err.exception.status_code, 503)
+        self.assertEqual(Auth.hash_pending, 0)
+
+
+class TestAuthCurrentUser(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+        self.user = User(id=1, email='test@test.com')
+        token_cache = patch('src.services.auth.token_cache', TokenCache(maxsize=16))
+        user_cache = patch('src.services.auth.user_cache', UserCache(maxsize=16, local_ttl=30, ttl=300))
+        get_user = patch('src.services.auth.repository_users.get_user_by_email', return_value=self.user)
+        for patcher in (token_cache, user_cache, get_user):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_repeated_token_decoded_once(self):
+        token = await self.auth.create_access_token(data={"sub": self.user.email})
+        with patch.object(self.auth.jwt, 'decode', wraps=jwt.decode) as decode:
+            await self.auth.get_current_user(token, MagicMock())
+            result = await self.auth.get_current_user(token, MagicMock())
+        self.assertEqual(result.email, self.user.email)
+        self.assertEqual(decode.call_count, 1)
+
+    async def test_refresh_token_rejected(self):
+        token = await self.auth.create_refresh_token(data={"sub": self.user.email})
+        for _ in range(2):
+            with self.assertRaises(HTTPException) as err:
+                await self.auth.get_current_user(token, MagicMock())
+            self.assertEqual(err.exception.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import APIRouter, FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src.services.avatar import read_upload, process_avatar, upload_avatar, UploadLimitRoute, UPLOAD_OVERHEAD
+from src.services.storage import AvatarStorage, LocalStorage
+
+
+def make_image(width: int, height: int, image_format: str = 'JPEG') -> bytes:
+    output = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(output, format=image_format)
+    return output.getvalue()
+
+
+class TestAvatar(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.storage = LocalStorage(self.directory.name, '/static/avatars/')
+
+    async def test_read_upload(self):
+        data = b'x' * 100
+        self.assertEqual(await read_upload(UploadFile(filename='a.png', file=BytesIO(data)), max_size=100), data)
+
+    async def test_read_upload_too_large(self):
+        with self.assertRaises(HTTPException) as err:
+            await read_upload(UploadFile(filename='a.png', file=BytesIO(b'x' * 101)), max_size=100)
+        self.assertEqual(err.exception.status_code, 413)
+
+    def test_process_avatar(self):
+        avatar = Image.open(BytesIO(process_avatar(make_image(800, 300), 250, 1000)))
+        self.assertEqual(avatar.size, (250, 250))
+        self.assertEqual(avatar.format, 'PNG')
+
+    def test_process_invalid_image(self):
+        with self.assertRaises(HTTPException) as err:
+            process_avatar(b'not an image', 250, 1000)
+        self.assertEqual(err.exception.status_code, 400)
+
+    def test_process_too_many_pixels(self):
+        with self.assertRaises(HTTPException) as err:
+            process_avatar(make_image(1001, 10, 'PNG'), 250, 1000)
+        self.assertEqual(err.exception.status_code, 400)
+
+    async def test_upload_avatar_local(self):
+        file = UploadFile(filename='a.png', file=BytesIO(make_image(300, 400, 'PNG')))
+        with patch('src.services.avatar.settings.avatar_size', 50):
+            url = await upload_avatar(file, '1', self.storage)
+        self.assertTrue(url.startswith('/static/avatars/1-'))
+        saved = Path(self.directory.name) / url.rsplit('/', 1)[1]
+        self.assertEqual(Image.open(saved).size, (50, 50))
+
+    async def test_local_delete(self):
+        first = await self.storage.save('1', b'first')
+        second = await self.storage.save('1', b'second')
+        await self.storage.delete(first)
+        await self.storage.delete('https://www.gravatar.com/avatar/deadpool')
+        await self.storage.delete('/static/avatars/../secret.png')
+        self.assertEqual([path.name for path in Path(self.directory.name).iterdir()], [second.rsplit('/', 1)[1]])
+
+    def test_storage_must_implement_save(self):
+        with self.assertRaises(TypeError):
+            AvatarStorage()
+
+    async def test_local_name_outside_directory(self):
+        for name in ('../../evil', 'a/b', '/tmp/evil'):
+            with self.assertRaises(ValueError):
+                await self.storage.save(name, b'x')
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+
+class TestUploadLimitRoute(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        router = APIRouter(route_class=UploadLimitRoute)
+
+        @router.post("/upload")
+        async def upload(file: UploadFile = File()):
+            self.received.append(file.filename)
+            return {"size": len(await file.read())}
+
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+        patcher = patch('src.services.avatar.settings.avatar_max_size', 1000)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_within_limit(self):
+        response = self.client.post("/upload", files={"file": ("a.png", b'x' * 1000, "image/png")})
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.json(), {"size": 1000})
+
+    def test_content_length_too_large(self):
+        response = self.client.post("/upload", files={"file": ("a.png", b'x' * (1001 + UPLOAD_OVERHEAD), "image/png")})
+        self.assertEqual(response.status_code, 413, response.text)
+        self.assertEqual(self.received, [])
+
+    def test_streamed_body_too_large(self):
+        def chunks():
+            yield b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'
+            for _ in range(100):
+                yield b'x' * 1024
+
+        response = self.client.post("/upload", content=chunks(),
+                                    headers={"Content-Type": "multipart/form-data; boundary=boundary"})
+        self.assertNotIn("content-length", response.request.headers)
+        self.assertEqual(response.status_code, 413, response.text)
+        self.assertEqual(self.received, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
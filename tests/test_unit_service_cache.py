@@ -0,0 +1,269 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from time import time
+from unittest.mock import AsyncMock, MagicMock
+
+import orjson
+from redis.exceptions import ConnectionError
+
+from src.database.models import User, Contact
+from src.schemas import ContactResponse
+from src.services.cache import UserCache, TokenCache, ContactsVersion, PageCache
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = UserCache(maxsize=2, local_ttl=30, ttl=300)
+        self.user = User(id=1, username='deadpool', email='test@test.com', password='hash', refresh_token='qwerty123',
+                         created_at=datetime(2023, 5, 1), avatar='avatar', confirmed=True)
+
+    async def store(self, user: User):
+        await self.cache.set(user, await self.cache.generation(user.email))
+
+    async def test_miss(self):
+        result = await self.cache.get('test@test.com')
+        self.assertIsNone(result)
+        self.assertEqual(self.cache.misses, 1)
+
+    async def test_local_hit(self):
+        await self.store(self.user)
+        result = await self.cache.get('test@test.com')
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(result.created_at, self.user.created_at)
+        self.assertIsNone(result.password)
+        self.assertIsNone(result.refresh_token)
+        self.assertIsNot(result, self.user)
+        self.assertEqual(self.cache.local_hits, 1)
+
+    async def test_local_expired(self):
+        self.cache.local_ttl = -1
+        await self.store(self.user)
+        self.assertIsNone(await self.cache.get('test@test.com'))
+
+    async def test_local_lru_eviction(self):
+        for user_id in range(3):
+            await self.store(User(id=user_id, email=f'{user_id}@test.com', created_at=None))
+        self.assertIsNone(await self.cache.get('0@test.com'))
+        self.assertIsNotNone(await self.cache.get('2@test.com'))
+
+    async def test_redis_hit(self):
+        redis = AsyncMock()
+        redis.get.return_value = json.dumps(UserCache._dump(self.user))
+        self.cache.init(redis)
+        result = await self.cache.get('test@test.com')
+        self.assertEqual(result.email, self.user.email)
+        self.assertEqual(self.cache.redis_hits, 1)
+        redis.get.assert_awaited_once_with('user:test@test.com')
+
+    async def test_redis_error_falls_back(self):
+        redis = MagicMock()
+        redis.get = AsyncMock(side_effect=ConnectionError())
+        self.cache.init(redis)
+        self.assertIsNone(await self.cache.get('test@test.com'))
+        await self.store(self.user)
+        self.assertIsNotNone(await self.cache.get('test@test.com'))
+
+    async def test_invalidate(self):
+        redis = MagicMock()
+        redis.get = AsyncMock(return_value=None)
+        self.cache.init(redis)
+        self.cache.set_script = AsyncMock(return_value=1)
+        self.cache.invalidate_script = AsyncMock()
+        await self.store(self.user)
+        self.cache.set_script.assert_awaited_once_with(keys=['user:test@test.com', 'user_generation:test@test.com'],
+                                                       args=['0', json.dumps(UserCache._dump(self.user)), 300])
+        await self.cache.invalidate('test@test.com')
+        self.assertIsNone(await self.cache.get('test@test.com'))
+        self.cache.invalidate_script.assert_awaited_once_with(
+            keys=['user:test@test.com', 'user_generation:test@test.com'], args=[300])
+
+    async def test_stale_set_after_invalidate(self):
+        generation = await self.cache.generation('test@test.com')
+        await self.cache.invalidate('test@test.com')
+        await self.cache.set(self.user, generation)
+        self.assertIsNone(await self.cache.get('test@test.com'))
+        await self.store(self.user)
+        self.assertIsNotNone(await self.cache.get('test@test.com'))
+
+    async def test_stale_set_after_invalidate_by_another_worker(self):
+        redis = MagicMock()
+        redis.get = AsyncMock(return_value=None)
+        self.cache.init(redis)
+        self.cache.set_script = AsyncMock(return_value=0)
+        await self.store(self.user)
+        self.assertIsNone(await self.cache.get('test@test.com'))
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TokenCache(maxsize=2)
+        self.payload = {'sub': 'test@test.com', 'scope': 'access_token', 'exp': time() + 60}
+
+    def test_hit(self):
+        self.cache.set('token', self.payload)
+        self.assertEqual(self.cache.get('token'), self.payload)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_expired(self):
+        self.cache.set('token', dict(self.payload, exp=time() - 1))
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_without_exp_not_cached(self):
+        self.cache.set('token', {'sub': 'test@test.com', 'scope': 'access_token'})
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_eviction(self):
+        for token in ('a', 'b', 'c'):
+            self.cache.set(token, self.payload)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class TestContactsVersion(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.version = ContactsVersion(ttl=60)
+
+    async def test_local_bump(self):
+        version = await self.version.get(1)
+        self.assertEqual(await self.version.get(1), version)
+        await self.version.bump(1)
+        self.assertNotEqual(await self.version.get(1), version)
+
+    async def test_redis_created_once(self):
+        redis = AsyncMock()
+        redis.set.return_value = 'abc'
+        self.version.init(redis)
+        self.assertEqual(await self.version.get(1), 'abc')
+        redis.set.assert_awaited_once()
+        self.assertTrue(redis.set.await_args.kwargs['nx'])
+        self.assertTrue(redis.set.await_args.kwargs['get'])
+
+    async def test_redis_created(self):
+        redis = FakeRedis()
+        self.version.init(redis)
+        version = await self.version.get(1)
+        self.assertEqual(redis.data['contacts_version:1'], version)
+        self.assertEqual(await self.version.get(1), version)
+
+    async def test_redis_error_unknown(self):
+        redis = AsyncMock()
+        redis.set.side_effect = ConnectionError()
+        self.version.init(redis)
+        self.assertIsNone(await self.version.get(1))
+
+    async def test_failed_bump_retried(self):
+        redis = FakeRedis()
+        self.version.init(redis)
+        version = await self.version.get(1)
+        redis.fail = True
+        await self.version.bump(1)
+        redis.fail = False
+        # the write is not yet visible in Redis, so this process does not trust the old version
+        self.assertEqual(redis.data['contacts_version:1'], version)
+        retried = await self.version.get(1)
+        self.assertNotIn(retried, (None, version))
+        self.assertEqual(self.version.stats(), {"bump_failures": 1, "pending": 0})
+
+    async def test_unknown_while_bump_fails(self):
+        redis = FakeRedis()
+        self.version.init(redis)
+        await self.version.get(1)
+        redis.fail = True
+        await self.version.bump(1)
+        self.assertIsNone(await self.version.get(1))
+        self.assertEqual(self.version.stats(), {"bump_failures": 1, "pending": 1})
+
+
+class FakeRedis:
+    """
+    Dictionary backed stand-in for the Redis commands used by the caches. Every command yields to the event loop
+    like a network call, so concurrent tasks interleave between commands.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+
+    async def get(self, key):
+        await asyncio.sleep(0)
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        await asyncio.sleep(0)
+        if self.fail:
+            raise ConnectionError()
+        current = self.data.get(key)
+        if nx and key in self.data:
+            return current if get else None
+        self.data[key] = value
+        return current if get else True
+
+
+class TestPageCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        redis = FakeRedis()
+        self.version = ContactsVersion(ttl=60)
+        self.version.init(redis)
+        self.cache = PageCache(ContactResponse, ttl=60)
+        self.cache.init(redis)
+        self.rows = [self.contact('Wade')]
+
+    @staticmethod
+    def contact(firstname: str) -> Contact:
+        return Contact(id=1, firstname=firstname, lastname='Wilson', email='wade@example.com', phone='+380501234567',
+                       birthday=datetime(1991, 2, 1), created_at=datetime(2023, 5, 1), updated_at=datetime(2023, 5, 1))
+
+    async def load(self):
+        await asyncio.sleep(0)
+        return list(self.rows)
+
+    async def read(self):
+        return await self.cache.get_or_load(1, await self.version.get(1), ('list', 0, 25, None), self.load)
+
+    async def write(self, firstname: str):
+        self.rows = [self.contact(firstname)]
+        await self.version.bump(1)
+
+    async def test_hit(self):
+        first = await self.read()
+        second = await self.read()
+        self.assertEqual(orjson.dumps(first), orjson.dumps(second))
+        self.assertEqual(second[0]['birthday'], '1991-02-01T00:00:00')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+    async def test_write_invalidates(self):
+        await self.read()
+        await self.write('Deadpool')
+        self.assertEqual((await self.read())[0]['firstname'], 'Deadpool')
+
+    async def test_write_during_load(self):
+        reader = asyncio.create_task(self.read())
+        await asyncio.sleep(0)
+        await self.write('Deadpool')
+        await reader
+        self.assertEqual((await self.read())[0]['firstname'], 'Deadpool')
+
+    async def test_concurrent_reads_and_writes(self):
+        names = [f'name{number}' for number in range(20)]
+        await asyncio.gather(*(task for name in names for task in (self.write(name), self.read())))
+        self.assertEqual((await self.read())[0]['firstname'], names[-1])
+
+    async def test_without_version(self):
+        self.assertEqual((await self.cache.get_or_load(1, None, ('list',), self.load))[0]['firstname'], 'Wade')
+        self.assertEqual(self.cache.stats()['misses'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
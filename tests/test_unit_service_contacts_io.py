@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.services.contacts_io import iter_csv, iter_ndjson, import_contacts, export_csv, export_ndjson
+
+
+async def stream(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.user = User(id=1)
+        self.row = {"firstname": "Test", "lastname": "Tests", "email": "test@test.com", "phone": "0998887766",
+                    "birthday": "1990-02-03T00:00:00"}
+
+    async def test_iter_csv(self):
+        data = 'firstname,lastname\r\nTëst,"Multi\nline, ""quoted"""\n\nShort\n'.encode()
+        rows = [row async for row in iter_csv(stream(data))]
+        self.assertEqual(rows, [(1, {"firstname": "Tëst", "lastname": 'Multi\nline, "quoted"'}, None),
+                                (2, None, 'Expected 2 columns, got 1')])
+
+    async def test_iter_ndjson(self):
+        data = b'{"firstname": "Test"}\n\n[1]\n{broken\n'
+        rows = [row async for row in iter_ndjson(stream(data))]
+        self.assertEqual(rows[0], (1, {"firstname": "Test"}, None))
+        self.assertEqual(rows[1], (2, None, 'Expected a JSON object'))
+        self.assertTrue(rows[2][2].startswith('Invalid JSON'))
+
+    async def test_import_batches_and_errors(self):
+        rows = [dict(self.row, phone=f'099888{i:04}', email=f'test{i}@test.com') for i in range(5)]
+        rows[1]["email"] = "not an email"
+        data = '\n'.join(json.dumps(row) for row in rows).encode()
+        create_contacts = AsyncMock(side_effect=lambda bodies, user, db: [body.phone for body in bodies][1:])
+        with patch('src.services.contacts_io.repository_contacts.create_contacts', create_contacts), \
+                patch('src.services.contacts_io.settings.bulk_import_batch_size', 2):
+            report = await import_contacts(stream(data), 'application/x-ndjson', self.user, self.session)
+        self.assertEqual(create_contacts.await_count, 2)
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(report["failed"], 3)
+        self.assertEqual([error["row"] for error in report["errors"]], [2, 1, 4])
+
+    async def test_import_line_too_long(self):
+        with patch('src.services.contacts_io.settings.bulk_import_max_line', 10):
+            report = await import_contacts(stream(b'x' * 100), 'text/csv', self.user, self.session)
+        self.assertEqual(report["failed"], 1)
+        self.assertIn('import stopped', report["errors"][0]["detail"])
+
+    async def test_import_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            await import_contacts(stream(b''), 'application/json', self.user, self.session)
+
+
+async def rows(count: int):
+    for i in range(count):
+        yield (i, 'Test', 'Tests, Jr', f'test{i}@test.com', f'099888{i:04}', datetime(1990, 2, 3),
+               datetime(2023, 5, 1), datetime(2023, 5, 1))
+
+
+class TestContactsExport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_export_ndjson(self):
+        with patch('src.services.contacts_io.settings.export_batch_size', 2):
+            chunks = [chunk async for chunk in export_ndjson(rows(3))]
+        self.assertEqual(len(chunks), 2)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(json.loads(lines[2])["email"], 'test2@test.com')
+        self.assertEqual(json.loads(lines[0])["birthday"], '1990-02-03T00:00:00')
+
+    async def test_export_csv_round_trip(self):
+        with patch('src.services.contacts_io.settings.export_batch_size', 2):
+            chunks = [chunk async for chunk in export_csv(rows(3))]
+        self.assertEqual(len(chunks), 2)
+        imported = [row async for row in iter_csv(stream(b''.join(chunks)))]
+        self.assertEqual(len(imported), 3)
+        self.assertEqual(imported[1][1]["lastname"], 'Tests, Jr')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import socket
+from email import message_from_bytes
+import unittest
+from pathlib import Path
+
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig
+
+from src.services.email import MailWorker, render_emails, confirmation_body, CONFIRMATION_SUBJECT
+
+
+class Handler:
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first:
+            self.fail_first -= 1
+            return '451 Try again later'
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestMailWorker(unittest.IsolatedAsyncioTestCase):
+
+    def start_server(self, handler: Handler) -> ConnectionConfig:
+        port = free_port()
+        controller = Controller(handler, hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        return ConnectionConfig(
+            MAIL_USERNAME='', MAIL_PASSWORD='', MAIL_FROM='sender@example.com', MAIL_PORT=port,
+            MAIL_SERVER='127.0.0.1', MAIL_STARTTLS=False, MAIL_SSL_TLS=False, USE_CREDENTIALS=False,
+            VALIDATE_CERTS=False, TEMPLATE_FOLDER=Path(__file__).parent.parent / 'src' / 'services' / 'templates',
+        )
+
+    @staticmethod
+    def emails(count: int) -> list:
+        emails = [f'user{i}@example.com' for i in range(count)]
+        recipients = [(email, confirmation_body(email, 'deadpool', 'http://localhost/')) for email in emails]
+        return list(render_emails(recipients, CONFIRMATION_SUBJECT))
+
+    async def test_reuses_connection(self):
+        handler = Handler()
+        worker = MailWorker(self.start_server(handler), idle_timeout=30)
+        self.addAsyncCleanup(worker.close)
+        for _ in range(2):
+            self.assertEqual(await worker.deliver(self.emails(5)), [None] * 5)
+        self.assertEqual(len(handler.messages), 10)
+        self.assertEqual(worker.connections, 1)
+        self.assertEqual(worker.stats()["sent"], 10)
+        body = message_from_bytes(handler.messages[0].content).get_payload(decode=True)
+        self.assertIn(b'deadpool', body)
+
+    async def test_idle_connection_replaced(self):
+        handler = Handler()
+        worker = MailWorker(self.start_server(handler), idle_timeout=-1)
+        self.addAsyncCleanup(worker.close)
+        for _ in range(2):
+            await worker.deliver(self.emails(1))
+        self.assertEqual(len(handler.messages), 2)
+        self.assertEqual(worker.connections, 2)
+
+    async def test_failed_send_reported(self):
+        handler = Handler(fail_first=1)
+        worker = MailWorker(self.start_server(handler), idle_timeout=30)
+        self.addAsyncCleanup(worker.close)
+        with self.assertLogs('src.services.email', level='WARNING') as logs:
+            errors = await worker.deliver(self.emails(2))
+        self.assertIn('user0@example.com', logs.output[0])
+        self.assertIsNotNone(errors[0])
+        self.assertIsNone(errors[1])
+        self.assertEqual(len(handler.messages), 1)
+        self.assertEqual(worker.stats(), {"sent": 1, "failed": 1, "connections": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
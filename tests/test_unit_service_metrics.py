@@ -0,0 +1,62 @@
+import unittest
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.services.metrics import MetricsMiddleware, instrument_engine, registry, render_metrics
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=pool.NullPool)
+        instrument_engine(self.engine.sync_engine)
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                await connection.execute(text("SELECT 2"))
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"id": item_id}
+
+        self.client = TestClient(app)
+
+    @staticmethod
+    def sample(name: str, **labels) -> float:
+        return registry.get_sample_value(name, labels) or 0.0
+
+    def test_records_route_status_and_queries(self):
+        route = {"method": "GET", "route": "/items/{item_id}"}
+        requests = self.sample('http_request_duration_seconds_count', **route)
+        queries = self.sample('db_queries_per_request_sum', **route)
+        not_found = self.sample('http_requests_total', status='404', **route)
+
+        self.assertEqual(self.client.get("/items/1").status_code, 200)
+        self.assertEqual(self.client.get("/items/0").status_code, 404)
+
+        self.assertEqual(self.sample('http_request_duration_seconds_count', **route), requests + 2)
+        self.assertEqual(self.sample('db_queries_per_request_sum', **route), queries + 4)
+        self.assertEqual(self.sample('http_requests_total', status='404', **route), not_found + 1)
+        self.assertEqual(self.sample('http_requests_in_progress', method='GET'), 0)
+
+    def test_unmatched_route(self):
+        labels = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = self.sample('http_requests_total', **labels)
+        self.client.get("/missing/1")
+        self.assertEqual(self.sample('http_requests_total', **labels), before + 1)
+
+    def test_render(self):
+        self.client.get("/items/1")
+        body, content_type = render_metrics()
+        self.assertTrue(content_type.startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/items/{item_id}"}', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
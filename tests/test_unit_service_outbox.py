@@ -0,0 +1,37 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox
+from src.services.outbox import process_batch
+
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.mailer = MagicMock()
+        self.mailer.deliver = AsyncMock(return_value=[None, 'Connection refused'])
+
+    async def test_process_batch(self):
+        entries = [EmailOutbox(id=1, email='a@test.com', username='a', host='http://localhost/'),
+                   EmailOutbox(id=2, email='b@test.com', username='b', host='http://localhost/')]
+        with patch('src.services.outbox.repository_outbox.claim_emails', AsyncMock(return_value=entries)), \
+                patch('src.services.outbox.repository_outbox.complete_emails', AsyncMock()) as complete:
+            count = await process_batch(self.mailer, self.session)
+        self.assertEqual(count, 2)
+        messages = self.mailer.deliver.await_args.args[0]
+        self.assertEqual([message["To"] for message in messages], ['a@test.com', 'b@test.com'])
+        complete.assert_awaited_once_with(entries, [None, 'Connection refused'], self.session)
+
+    async def test_process_empty_batch(self):
+        with patch('src.services.outbox.repository_outbox.claim_emails', AsyncMock(return_value=[])):
+            count = await process_batch(self.mailer, self.session)
+        self.assertEqual(count, 0)
+        self.mailer.deliver.assert_not_awaited()
+        self.session.commit.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
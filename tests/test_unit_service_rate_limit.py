@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from redis.exceptions import ConnectionError
+
+from src.services.rate_limit import RateLimitEngine, parse_limit
+
+
+class TestRateLimitEngine(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = RateLimitEngine('3/5', {'create_contact': '1/60'}, sync_interval=0.5)
+
+    def mock_redis(self, counts=None, error=None):
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=counts, side_effect=error)
+        redis = MagicMock()
+        redis.pipeline.return_value.__aenter__.return_value = pipe
+        self.engine.init(redis)
+        self.engine.script = AsyncMock()
+        return pipe
+
+    def test_parse_limit(self):
+        self.assertEqual(parse_limit('10/60'), (10, 60))
+
+    def test_describe(self):
+        self.assertEqual(self.engine.describe('read_contacts'), 'No more than 3 requests per 5 seconds')
+        self.assertEqual(self.engine.describe('create_contact'), 'No more than 1 request per 60 seconds')
+
+    def test_local_limit(self):
+        results = [self.engine.hit('read_contacts', 1) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    def test_limit_per_user(self):
+        for _ in range(3):
+            self.engine.hit('read_contacts', 1)
+        self.assertEqual(self.engine.hit('read_contacts', 2), 0)
+
+    def test_limit_per_route(self):
+        self.assertEqual(self.engine.hit('create_contact', 1), 0)
+        self.assertGreater(self.engine.hit('create_contact', 1), 0)
+        self.assertEqual(self.engine.hit('read_contacts', 1), 0)
+
+    async def test_sync_applies_global_count(self):
+        pipe = self.mock_redis(counts=[3])
+        self.assertEqual(self.engine.hit('read_contacts', 1), 0)
+        await self.engine.sync()
+        self.engine.script.assert_awaited_once()
+        self.assertEqual(self.engine.script.await_args.kwargs['args'][0], 1)
+        self.assertIs(self.engine.script.await_args.kwargs['client'], pipe)
+        self.assertGreater(self.engine.hit('read_contacts', 1), 0)
+
+    async def test_sync_sends_pending_hits_once(self):
+        self.mock_redis(counts=[2])
+        self.engine.hit('read_contacts', 1)
+        self.engine.hit('read_contacts', 1)
+        await self.engine.sync()
+        self.assertEqual(self.engine.script.await_args.kwargs['args'][0], 2)
+        await self.engine.sync()
+        self.engine.script.assert_awaited_once()
+
+    async def test_sync_error_fails_open(self):
+        self.mock_redis(error=ConnectionError())
+        self.engine.hit('read_contacts', 1)
+        await self.engine.sync()
+        self.assertEqual(self.engine.sync_errors, 1)
+        self.assertEqual(self.engine.hit('read_contacts', 1), 0)
+
+    async def test_sync_without_redis(self):
+        self.engine.hit('read_contacts', 1)
+        await self.engine.sync()
+        self.assertEqual(self.engine.stats(), {"buckets": 1, "sync_errors": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+from jose import jwt
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.refresh_tokens import RefreshTokens
+
+
+def claims(token: str) -> dict:
+    return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+
+
+class TestRefreshTokensLocal(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tokens = RefreshTokens(ttl=60)
+
+    async def assert_rejected(self, payload: dict):
+        with self.assertRaises(HTTPException) as err:
+            await self.tokens.rotate(payload)
+        self.assertEqual(err.exception.status_code, 401)
+
+    async def test_issue(self):
+        payload = claims(await self.tokens.issue('test@test.com'))
+        self.assertEqual(payload['sub'], 'test@test.com')
+        self.assertEqual(payload['scope'], 'refresh_token')
+        self.assertEqual(payload['exp'] - payload['iat'], 60)
+        self.assertEqual(self.tokens._local[payload['fam']][0], payload['jti'])
+
+    async def test_rotate(self):
+        first = claims(await self.tokens.issue('test@test.com'))
+        second = claims(await self.tokens.rotate(first))
+        self.assertEqual(second['fam'], first['fam'])
+        self.assertNotEqual(second['jti'], first['jti'])
+        third = claims(await self.tokens.rotate(second))
+        self.assertEqual(self.tokens.stats(), {"issued": 1, "rotated": 2, "rejected": 0})
+        self.assertEqual(self.tokens._local[first['fam']][0], third['jti'])
+
+    async def test_reuse_revokes_family(self):
+        first = claims(await self.tokens.issue('test@test.com'))
+        second = claims(await self.tokens.rotate(first))
+        await self.assert_rejected(first)
+        await self.assert_rejected(second)
+        self.assertNotIn(first['fam'], self.tokens._local)
+
+    async def test_devices_are_independent(self):
+        laptop = claims(await self.tokens.issue('test@test.com'))
+        phone = claims(await self.tokens.issue('test@test.com'))
+        self.assertNotEqual(laptop['fam'], phone['fam'])
+        await self.tokens.rotate(laptop)
+        await self.assert_rejected(laptop)
+        await self.tokens.rotate(phone)
+
+    async def test_expired_family(self):
+        payload = claims(await self.tokens.issue('test@test.com'))
+        self.tokens._local[payload['fam']] = (payload['jti'], 0.0)
+        await self.assert_rejected(payload)
+
+    async def test_token_without_family(self):
+        await self.assert_rejected({"sub": 'test@test.com', "scope": 'refresh_token'})
+        self.assertEqual(self.tokens.rejected, 1)
+
+
+class TestRefreshTokensRedis(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.redis.set = AsyncMock()
+        self.tokens = RefreshTokens(ttl=60)
+        self.tokens.init(self.redis)
+        self.tokens.script = AsyncMock(return_value=1)
+
+    async def test_issue(self):
+        payload = claims(await self.tokens.issue('test@test.com'))
+        self.redis.set.assert_awaited_once_with(f"refresh_family:{payload['fam']}", payload['jti'], ex=60)
+
+    async def test_rotate(self):
+        first = claims(await self.tokens.issue('test@test.com'))
+        second = claims(await self.tokens.rotate(first))
+        self.tokens.script.assert_awaited_once_with(keys=[f"refresh_family:{first['fam']}"],
+                                                    args=[first['jti'], second['jti'], 60])
+
+    async def test_reused(self):
+        payload = claims(await self.tokens.issue('test@test.com'))
+        self.tokens.script.return_value = 0
+        with self.assertRaises(HTTPException) as err:
+            await self.tokens.rotate(payload)
+        self.assertEqual(err.exception.status_code, 401)
+
+    async def test_redis_error(self):
+        self.redis.set.side_effect = RedisError
+        with self.assertRaises(HTTPException) as err:
+            await self.tokens.issue('test@test.com')
+        self.assertEqual(err.exception.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
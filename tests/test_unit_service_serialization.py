@@ -0,0 +1,31 @@
+import json
+import unittest
+from datetime import datetime
+
+import orjson
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services.serialization import dump_rows
+
+
+class TestDumpRows(unittest.TestCase):
+
+    def setUp(self):
+        self.contacts = [Contact(id=contact_id, firstname='Wade', lastname='Wilson', email=f'{contact_id}@example.com',
+                                 phone='+380501234567', birthday=datetime(1991, 2, 1),
+                                 created_at=datetime(2023, 5, 1, 12, 30, 15, 123456), updated_at=datetime(2023, 5, 2))
+                         for contact_id in range(3)]
+
+    def test_same_json_as_response_model(self):
+        expected = [json.loads(ContactResponse.from_orm(contact).json()) for contact in self.contacts]
+        self.assertEqual(orjson.loads(orjson.dumps(dump_rows(ContactResponse, self.contacts))), expected)
+
+    def test_only_model_fields(self):
+        rows = dump_rows(ContactResponse, self.contacts)
+        self.assertEqual(list(rows[0]), list(ContactResponse.__fields__))
+        self.assertNotIn('user_id', rows[0])
+
+
+if __name__ == '__main__':
+    unittest.main()